@@ -24,26 +24,88 @@ SOFTWARE.
 
 import math
 import random
+import numpy as np
 from copy import deepcopy
 from snake import *
+from occupancy import Occupancy
+from zobrist import ZobristKeys
+from fruitindex import FruitIndex
+from gameconfig import GameConfig
+from move import toMove
+from instrument import clock
 from constants import DIRECTIONS, MOVES, FRUIT_VAL, FRUIT_BONUS
 
+class UpdateChanges:
+    """
+    Undo record of a whole State.update (and of anything else done while it is the state's journal):
+    the iteration, the points of every snake and the order of the snakes before the update,
+    body/points changes of the snakes which moved, fruits and scores overwritten, and the dead snakes.
+    """
+
+    def __init__(self, state):
+        self.iter = state.iter
+        self.order = list(state.snakes.keys())
+        self.points = {id : s.points for id, s in state.snakes.items()}
+        self.moved = []
+        self.fruits = []
+        self.scores = []
+        self.deads = []
+
+    def recordMove(self, snake, move):
+        """
+        Remember what `snake` looks like before `move`: moving adds move.norm() cells at the head and
+        pops at most 3 cells from the tail.
+        """
+        tail = list(snake.position)[-3:] if len(snake.position) > 3 else list(snake.position)
+        self.moved.append((snake, move.norm(), len(snake.position), tail, snake.points, snake.on_tail, snake.last_tail))
+
 class State:
     """
     State object for the multiplayer snake game.
     Defined by a dictionary {id => snake} and {position => value} for fruits.
+    Snakes share the state's occupancy grid. The settings of the game come from `config`
+    (by default, the grid size of the occupancy grid or of the snakes and their number).
     """
 
-    grid_size = None
-    num_snakes = 0
-    max_iter = None
-
-    def __init__(self, snakes, fruits):
+    def __init__(self, snakes, fruits, occupancy=None, config=None):
         self.snakes = snakes
+        if config is None:
+            if occupancy is not None:
+                grid_size = occupancy.grid_size
+            elif snakes:
+                grid_size = next(iter(snakes.values())).grid_size
+            else:
+                raise ValueError("State needs a config, an occupancy grid or snakes to know its grid size")
+            config = GameConfig(grid_size, len(snakes))
+        self.config = config
+        if occupancy is None:
+            occupancy = Occupancy(self.grid_size)
+            for s in snakes.values():
+                s.setOccupancy(occupancy)
+        self.occupancy = occupancy
         self.fruits = {f.position : f.value for f in fruits}
         #self.fruits = dict((c.position, c.value) for c in fruits)
+        self.fruit_index = FruitIndex(self.grid_size)
+        # value of the fruit on each cell (0 if none)
+        self.fruit_grid = np.zeros((self.grid_size, self.grid_size), dtype=np.uint8)
+        for pos, val in self.fruits.items():
+            self.fruit_index.add(pos)
+            self.fruit_grid[pos] = val
         self.scores = {}
         self.iter = 0
+        self.journal = None
+
+    @property
+    def grid_size(self):
+        return self.config.grid_size
+
+    @property
+    def num_snakes(self):
+        return self.config.num_snakes
+
+    @property
+    def max_iter(self):
+        return self.config.max_iter
 
     def isAlive(self, snake_id):
         """
@@ -58,12 +120,49 @@ class State:
         :param val: the value of the fruit
         :return: True if the fruit has been added, False if not
         """
-        if all(not s.onSnake(pos) for a, s in self.snakes.items() if a != dead_snake) \
-                and not pos in list(self.fruits.keys()):
-            self.fruits[pos] = val
+        if self.occupancy.countOthers(pos, dead_snake) == 0 and not pos in self.fruits:
+            self._putFruit(pos, val)
+            if self.journal is not None:
+                self.journal.fruits.append((pos, None))
             return True
         return False
 
+    def _putFruit(self, pos, val):
+        self.fruits[pos] = val
+        self.fruit_index.add(pos)
+        self.fruit_grid[pos] = val
+        if self.occupancy.keys is not None:
+            self.occupancy.hash ^= self.occupancy.keys.fruit(pos, val)
+
+    def _dropFruit(self, pos):
+        val = self.fruits.pop(pos)
+        self.fruit_index.remove(pos)
+        self.fruit_grid[pos] = 0
+        if self.occupancy.keys is not None:
+            self.occupancy.hash ^= self.occupancy.keys.fruit(pos, val)
+        return val
+
+    def removeFruit(self, pos):
+        """
+        Removes the fruit at position pos and returns its value
+        """
+        val = self._dropFruit(pos)
+        if self.journal is not None:
+            self.journal.fruits.append((pos, val))
+        return val
+
+    def nearestFruit(self, pos):
+        """
+        (distance, seq, position) of the fruit closest to `pos`, None if there are no fruits.
+        Ties are broken by insertion order of the fruits.
+        """
+        return self.fruit_index.nearest(pos)
+
+    def setScore(self, id, score):
+        if self.journal is not None:
+            self.journal.scores.append((id, self.scores.get(id)))
+        self.scores[id] = score
+
     def addNRandomFruits(self, n, grid_size):
         while n > 0:
             if self.addFruit(
@@ -73,9 +172,20 @@ class State:
                 n -= 1
 
     def onOtherSnakes(self, pos, id):
-        return any(s.onSnake(pos) for i,s in self.snakes.items() if i != id)
+        return self.occupancy.countOthers(pos, id) > 0
+
+    def removeSnake(self, id):
+        """
+        Remove snake `id` from the state and free its cells.
+        """
+        snake = self.snakes.pop(id)
+        snake.release()
+        if self.journal is not None:
+            self.journal.deads.append((id, snake))
+        return snake
 
     def oneAgentUpdate(self, id, m):
+        m = toMove(m)
         #Remember changes
         snake_who_died = None
         fruits_to_add = []
@@ -89,7 +199,7 @@ class State:
         accelerated = {}
         # If the snake couldn't move, then it's dead
         if m is None:
-            snake_who_died = deepcopy(self.snakes[id])
+            snake_who_died = self.snakes[id]
         else:
             if m.norm() == 2:
                 last_pos.append(self.snakes[id].position[-2])
@@ -105,8 +215,7 @@ class State:
             if head in self.fruits:
                 points_won += self.fruits.get(head)
                 fruits_removed.append((head, self.fruits.get(head)))
-                self.snakes[id].addPoints(self.fruits.get(head))
-                del self.fruits[head]
+                self.snakes[id].addPoints(self.removeFruit(head))
 
             # If the snake accelerated, we check if the second part of the body touches a fruit
             if m.norm() == 2:
@@ -115,8 +224,7 @@ class State:
                 if second in self.fruits:
                     points_won += self.fruits.get(second)
                     fruits_removed.append((second, self.fruits.get(second)))
-                    self.snakes[id].addPoints(self.fruits.get(second))
-                    del self.fruits[second]
+                    self.snakes[id].addPoints(self.removeFruit(second))
             else:
                 accelerated[id] = False
 
@@ -129,37 +237,131 @@ class State:
         if snake_who_died is None and (self.onOtherSnakes(self.snakes[id].position[0], id)\
                 or (accelerated[id] and self.onOtherSnakes(self.snakes[id].position[1], id))\
                 or not utils.isOnGrid(self.snakes[id].position[0], self.grid_size)):
-            snake_who_died = deepcopy(self.snakes[id])
+            snake_who_died = self.snakes[id]
 
 
         if snake_who_died is not None:
             # add fruits on the snake position before last move
-            self.snakes[id].popleft()
-            for p in self.snakes[id].position:
+            for i in range(1, len(snake_who_died.position)):
+                p = snake_who_died.position[i]
                 if self.addFruit(p, FRUIT_BONUS, dead_snake=id):
                     fruits_to_add.append(p)
             # print "Snake {} died with {} points".format(id, self.snakes[id].points)
-            del self.snakes[id]
+            # the dead snake is kept untouched so that reverseChanges can put it back
+            self.removeSnake(id)
 
         return last_pos, id, fruits_to_add, fruits_removed, points_won, last_tail, snake_who_died
 
     def reverseChanges(self, changes):
+        """
+        Undo the changes returned by oneAgentUpdate or journaledUpdate.
+        """
+        if isinstance(changes, UpdateChanges):
+            return self.reverseUpdate(changes)
         last_pos, id, fruits_added, fruits_removed, points_won, last_tail, snake_who_died = changes
         if snake_who_died is not None:
             self.snakes[id] = snake_who_died
+            snake_who_died.setOccupancy(self.occupancy)
         self.snakes[id].removePoints(points_won)
         self.snakes[id].backward(last_pos, last_tail)
         for c in set(fruits_added):
-            del self.fruits[c]
+            self.removeFruit(c)
         for c, val in fruits_removed:
             self.addFruit(c, val)
 
+    def enableHashing(self, keys=None):
+        """
+        Maintain a Zobrist hash of the state from now on (see zobristHash).
+        """
+        if self.occupancy.keys is not None:
+            return
+        if keys is None:
+            keys = ZobristKeys.get(self.grid_size, max(self.num_snakes, max(list(self.snakes.keys()) + [-1]) + 1))
+        self.occupancy.keys = keys
+        self.occupancy.hash = keys.full(self.occupancy, self.fruits)
+
+    def zobristHash(self, agent=None):
+        """
+        Zobrist hash of the state, and of the agent to move if given.
+        Body segments and fruits are hashed incrementally, heads, tails, on_tail flags and points
+        of the snakes are added here.
+        """
+        keys = self.occupancy.keys
+        if keys is None:
+            self.enableHashing()
+            keys = self.occupancy.keys
+        h = self.occupancy.hash
+        for s in self.snakes.values():
+            h ^= keys.snake(s)
+        if agent is not None:
+            h ^= int(keys.turn[agent])
+        return h
+
+    def beginJournal(self):
+        """
+        Start recording the changes made to the state in an UpdateChanges.
+        """
+        self.journal = UpdateChanges(self)
+        return self.journal
+
+    def endJournal(self):
+        changes = self.journal
+        self.journal = None
+        return changes
+
+    def journaledUpdate(self, moves):
+        """
+        Same as update, but returns an UpdateChanges that reverseChanges can roll back.
+        """
+        self.beginJournal()
+        self.update(moves)
+        return self.endJournal()
 
-    def update(self, moves):
+    def reverseUpdate(self, changes):
+        """
+        Roll back everything recorded in `changes`, most recent changes first.
+        """
+        for id, snake in reversed(changes.deads):
+            self.snakes[id] = snake
+            snake.setOccupancy(self.occupancy)
+        if changes.deads:
+            snakes = [(id, self.snakes[id]) for id in changes.order]
+            self.snakes.clear()
+            self.snakes.update(snakes)
+        for pos, val in reversed(changes.fruits):
+            if val is None:
+                self._dropFruit(pos)
+            else:
+                self._putFruit(pos, val)
+        for id, score in reversed(changes.scores):
+            if score is None:
+                del self.scores[id]
+            else:
+                self.scores[id] = score
+        for snake, n_heads, size, tail, points, on_tail, last_tail in reversed(changes.moved):
+            for _ in range(n_heads):
+                snake.popleft()
+            # the body is now a prefix of the former one, possibly with duplicated tail cells
+            missing = size - len(snake.position)
+            if missing > 0:
+                for pos in tail[len(tail) - missing:]:
+                    snake.addRight(pos)
+            for _ in range(-missing):
+                snake.pop()
+            snake.points = points
+            snake.on_tail = on_tail
+            snake.last_tail = last_tail
+        self.iter = changes.iter
+
+
+    def update(self, moves, profiler=None):
         """
-        `moves` is a dict {snake_id => move}
+        `moves` is a dict {snake_id => move}, moves being Move objects or their ids.
         Update the positions/points of every snakes and check for collisions.
+        With an instrument.Profiler, the moves and the collisions are timed.
         """
+        if profiler is not None:
+            start = clock()
         self.iter += 1
 
         deads = []
@@ -168,11 +370,14 @@ class State:
         fruits_to_add = []
         accelerated = {}
         for id, m in moves.items():
+            m = toMove(m)
             # If the snake couldn't move, then it's dead
             if m is None or not self.snakes[id].authorizedMove(m):
                 deads.append(id)
                 continue
 
+            if self.journal is not None:
+                self.journal.recordMove(self.snakes[id], m)
             new_fruit_pos = self.snakes[id].move(m)
 
             # We remember where to add fruits when the snake accelerated
@@ -182,16 +387,14 @@ class State:
             # We collect fruits if head touches a fruit
             head = self.snakes[id].head()
             if head in self.fruits:
-                self.snakes[id].addPoints(self.fruits.get(head))
-                del self.fruits[head]
+                self.snakes[id].addPoints(self.removeFruit(head))
 
             # If the snake accelerated, we check if the second part of the body touches a fruit
             if m.norm() == 2:
                 accelerated[id] = True
                 second = self.snakes[id].position[1]
                 if second in self.fruits:
-                    self.snakes[id].addPoints(self.fruits.get(second))
-                    del self.fruits[second]
+                    self.snakes[id].addPoints(self.removeFruit(second))
             else:
                 accelerated[id] = False
 
@@ -199,6 +402,10 @@ class State:
         for cand_pos in fruits_to_add:
             self.addFruit(cand_pos, FRUIT_BONUS)
 
+        if profiler is not None:
+            moved = clock()
+            profiler.record("update", moved - start)
+
         # remove snakes which bumped into other snakes
 
         for id in list(moves.keys()):
@@ -211,17 +418,21 @@ class State:
         # save scores and add fruits
         rank = len(self.snakes)
         for id in deads:
-            self.scores[id] = (rank, self.snakes[id].points)
+            self.setScore(id, (rank, self.snakes[id].points))
             # add fruits on the snake position before last move
             for p in self.snakes[id].position:
                 self.addFruit(p, FRUIT_BONUS, dead_snake=id)
             # print "Snake {} died with {} points".format(id, self.snakes[id].points)
-            del self.snakes[id]
+            self.removeSnake(id)
 
         if len(self.snakes) == 1:
             winner = list(self.snakes.keys())[0]
-            self.scores[winner] = (1, self.snakes[winner].points)
+            self.setScore(winner, (1, self.snakes[winner].points))
 
+        if profiler is not None:
+            profiler.record("collisions", clock() - moved)
+            if deads:
+                profiler.count("deaths", len(deads))
         return self
 
     def isWin(self, agent):
@@ -274,23 +485,15 @@ class State:
 
     def actions(self, player):
         """
-        List of possible actions for `player`.
+        List of possible actions for `player` (cached on the snake until it moves).
         """
-        snake = self.snakes.get(player)
-        head = snake.position[0]
-        return [m for m in MOVES
-                if utils.isOnGrid(m.apply(head), self.grid_size)
-                and snake.authorizedMove(m)]
+        return self.snakes.get(player).legalMoves()
 
     def simple_actions(self, player):
         """
-        List of possible actions for `player`.
+        List of possible actions for `player` (cached on the snake until it moves).
         """
-        snake = self.snakes.get(player)
-        head = snake.position[0]
-        return [m for m in MOVES if m.norm() == 1
-                and utils.isOnGrid(m.apply(head), self.grid_size)
-                and snake.authorizedMove(m, possibleNorm=[1])]
+        return self.snakes.get(player).legalMoves(simple=True)
 
     def all_actions(self, player):
         """
@@ -306,21 +509,22 @@ class State:
 
 
 class Game:
-    def __init__(self, grid_size, num_snakes = 2, fruit_ratio = 1, max_iter = None):
+    def __init__(self, grid_size, num_snakes = 2, fruit_ratio = 1, max_iter = None, compact_bodies = False):
         self.grid_size = grid_size
         self.num_snakes = num_snakes
         self.fruit_ratio = fruit_ratio
         self.max_iter = max_iter
+        # shared by the states of this game only
+        self.config = GameConfig(grid_size, num_snakes, fruit_ratio, max_iter, compact_bodies)
         self.current_state = None
         self.previous_state = None
+        self.last_changes = None
+        # random fruit position drawn by the last tick (recorded by replay.ReplayWriter)
+        self.last_fruit = None
+        # instrument.Profiler timing the phases of the ticks, if any
+        self.profiler = None
         self.agents = []
 
-        # Update static variables of State
-        State.grid_size = grid_size
-        newSnake.grid_size = grid_size
-        State.num_snakes = num_snakes
-        State.max_iter = max_iter
-
     def startingState(self):
         """
         Divides the map into equally size squares before randomly assigning each snake to a spawn square. Snake spawn are
@@ -339,6 +543,7 @@ class Game:
 
         assert self.grid_size >= 3*num_spawn_sections_row, "Map Grid is too small to guarantee all snakes will be spawned without overlap"
 
+        occupancy = Occupancy(self.grid_size)
         snakes = {}
         for snake, assign in enumerate(snake_assignment):
             ''' Randomly chose a point for the head in the assigned spawn section that is at least 2 away from the
@@ -346,9 +551,10 @@ class Game:
             head = (random.randint(1, spawn_section_size - 2) + (assign // num_spawn_sections_row) * spawn_section_size,
                     random.randint(1, spawn_section_size - 2) + (assign % num_spawn_sections_row) * spawn_section_size)
             # Create new snake with head at chosen location of length 2 with random starting direction
-            snakes[snake] = newSnake([head, utils.add(head, random.sample(DIRECTIONS, 1)[0])], snake)
+            snakes[snake] = newSnake([head, utils.add(head, random.sample(DIRECTIONS, 1)[0])], snake, occupancy,
+                                     compact=self.config.compact_bodies)
 
-        start_state = State(snakes, {})
+        start_state = State(snakes, {}, occupancy, self.config)
         # Randomly spawn fruit_ratio fruits for each snake
         start_state.addNRandomFruits(self.fruit_ratio * self.num_snakes, self.grid_size)
         return start_state
@@ -384,23 +590,57 @@ class Game:
         return self.current_state.isAlive(agent_id)
 
     def agentActions(self):
-        return {i: self.agents[i].nextAction(self.current_state) for i in list(self.current_state.snakes.keys())}
-
-    def tick(self, state, actions, copy=True):
-        if copy:
+        profiler = self.profiler
+        if profiler is None:
+            return {i: self.agents[i].nextAction(self.current_state) for i in list(self.current_state.snakes.keys())}
+        actions = {}
+        for i in list(self.current_state.snakes.keys()):
+            start = clock()
+            actions[i] = self.agents[i].nextAction(self.current_state)
+            profiler.record("agent {} ({})".format(i, self.agents[i].name), clock() - start)
+        return actions
+
+    def tick(self, state, actions, copy=True, journal=False):
+        """
+        Update `state` with `actions` and randomly add a fruit.
+        With `journal`, the state is updated in place and the changes are kept in `last_changes`:
+        `state.reverseChanges(game.last_changes)` rolls the whole tick back.
+        """
+        profiler = self.profiler
+        if profiler is not None:
+            start = clock()
+        if copy and not journal:
             newState = deepcopy(state)
+            if profiler is not None:
+                profiler.record("copy", clock() - start)
         else:
             newState = state
         self.previous_state = state
-        newState.update(actions)
+        if journal:
+            newState.beginJournal()
+        newState.update(actions, profiler)
+        if profiler is not None:
+            spawn = clock()
         rand_pos = (random.randint(0, self.grid_size - 1), random.randint(0, self.grid_size - 1))
-        newState.addFruit(rand_pos, FRUIT_VAL)
+        if newState.addFruit(rand_pos, FRUIT_VAL) and profiler is not None:
+            profiler.count("fruits spawned")
+        self.last_fruit = rand_pos
+        self.last_changes = newState.endJournal() if journal else None
+        if profiler is not None:
+            end = clock()
+            profiler.record("fruit spawn", end - spawn)
+            profiler.record("tick", end - start)
+            profiler.count("ticks")
         self.current_state = newState
         return newState
 
     def agentLastReward(self, agent_id):
         if agent_id in self.current_state.snakes:
-            reward = self.current_state.snakes[agent_id].points - self.previous_state.snakes[agent_id].points
+            if self.last_changes is not None:
+                previous_points = self.last_changes.points[agent_id]
+            else:
+                previous_points = self.previous_state.snakes[agent_id].points
+            reward = self.current_state.snakes[agent_id].points - previous_points
             if len(self.current_state.snakes) == 1: # it won
                 reward += 10.
         else: # it died
@@ -0,0 +1,90 @@
+'''
+MIT License
+
+Copyright (c) 2018 Sebastien Dubois, Sebastien Levy, Felix Crevier
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+"""
+Summed-area tables of the bodies and fruits of a state, for O(1) counts over any rectangle
+"""
+
+import weakref
+import numpy as np
+
+# occupancy => {snake id (None for every snake) => (occupancy version, table)}
+_body_tables = weakref.WeakKeyDictionary()
+# state => (fruit key, table)
+_fruit_tables = weakref.WeakKeyDictionary()
+
+def summedArea(grid):
+    """
+    (G+1, H+1) table whose cell (x, y) is the sum of grid[:x, :y].
+    """
+    table = np.zeros((grid.shape[0] + 1, grid.shape[1] + 1), dtype=np.int32)
+    np.cumsum(np.cumsum(grid, axis=0, dtype=np.int32), axis=1, out=table[1:, 1:])
+    return table
+
+def rectSum(table, x0, x1, y0, y1):
+    """
+    Sum of the cells [x0, x1) x [y0, y1) of the grid of `table`, clipped to the grid.
+    """
+    X, Y = table.shape[0] - 1, table.shape[1] - 1
+    x0, x1 = min(max(x0, 0), X), min(max(x1, 0), X)
+    y0, y1 = min(max(y0, 0), Y), min(max(y1, 0), Y)
+    if x0 >= x1 or y0 >= y1:
+        return 0
+    return int(table[x1, y1] - table[x0, y1] - table[x1, y0] + table[x0, y0])
+
+def rectArea(table, x0, x1, y0, y1):
+    """
+    Number of cells of [x0, x1) x [y0, y1) on the grid of `table`.
+    """
+    X, Y = table.shape[0] - 1, table.shape[1] - 1
+    return max(min(x1, X) - max(x0, 0), 0) * max(min(y1, Y) - max(y0, 0), 0)
+
+def bodyTable(occupancy, id_ = None):
+    """
+    Table of the cells occupied by snake `id_` (by any snake if None), rebuilt only when the
+    occupancy grid changed.
+    """
+    tables = _body_tables.get(occupancy)
+    if tables is None:
+        tables = _body_tables[occupancy] = {}
+    cached = tables.get(id_)
+    if cached is None or cached[0] != occupancy.version:
+        if id_ is None:
+            cells = occupancy.count > 0
+        else:
+            cells = occupancy.owner == id_
+            for pos, owners in occupancy.shared.items():
+                cells[pos] = owners.get(id_, 0) > 0
+        cached = tables[id_] = (occupancy.version, summedArea(cells))
+    return cached[1]
+
+def fruitTable(state):
+    """
+    Table of the cells of the fruits of `state`, rebuilt only when fruits were added or removed.
+    """
+    key = (len(state.fruits), state.fruit_index.seq)
+    cached = _fruit_tables.get(state)
+    if cached is None or cached[0] != key:
+        cached = _fruit_tables[state] = (key, summedArea(state.fruit_grid > 0))
+    return cached[1]
@@ -0,0 +1,459 @@
+'''
+MIT License
+
+Copyright (c) 2018 Sebastien Dubois, Sebastien Levy, Felix Crevier
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+"""
+Vectorized engine stepping many games in lockstep
+"""
+
+import math
+import numpy as np
+from GameInterface import State
+from gameconfig import GameConfig
+from occupancy import Occupancy
+from snake import newSnake
+from constants import DIRECTIONS, FRUIT_VAL, FRUIT_BONUS
+
+DELTAS = np.array(DIRECTIONS, dtype=np.int64)
+NO_MOVE = -1
+
+class BatchGame:
+    """
+    `n_games` games of `n_snakes` snakes following the rules of State.update and Game.tick.
+    Boards are stacked (n_games, grid_size, grid_size) layers laid out like occupancy.Occupancy:
+    `count` is the number of body segments on a cell, `owner` the id of the snake they belong
+    to (-1 if empty) and `fruits` the value of the fruit on the cell (0 if none).
+    Bodies are ring buffers of flat cells (x * grid_size + y), starting at `head_ptr` and
+    spanning `length` cells.
+    Moves are indices in DIRECTIONS, which are also the move ids of MOVES (see move.toMove),
+    NO_MOVE meaning the snake couldn't move.
+    Acceleration is not supported.
+    """
+
+    def __init__(self, n_games, grid_size, n_snakes = 2, fruit_ratio = 1, max_iter = None, seed = None,
+                 compact_bodies = False):
+        self.n_games = n_games
+        self.grid_size = grid_size
+        self.n_snakes = n_snakes
+        self.fruit_ratio = fruit_ratio
+        self.max_iter = max_iter
+        self.rng = np.random.default_rng(seed)
+
+        # settings of the states built by getState
+        self.config = GameConfig(grid_size, n_snakes, fruit_ratio, max_iter, compact_bodies)
+
+        shape = (n_games, grid_size, grid_size)
+        self.count = np.zeros(shape, dtype=np.uint8)
+        self.owner = np.full(shape, -1, dtype=np.int8)
+        self.fruits = np.zeros(shape, dtype=np.uint8)
+
+        self.capacity = 16
+        self.body = np.zeros((n_games, n_snakes, self.capacity), dtype=np.int32)
+        self.head_ptr = np.zeros((n_games, n_snakes), dtype=np.int64)
+        self.length = np.zeros((n_games, n_snakes), dtype=np.int64)
+        self.points = np.zeros((n_games, n_snakes), dtype=np.int64)
+        self.on_tail = np.zeros((n_games, n_snakes), dtype=bool)
+        self.last_tail = np.full((n_games, n_snakes), -1, dtype=np.int64)
+        self.alive = np.zeros((n_games, n_snakes), dtype=bool)
+
+        # scores as in State.scores, rank 0 meaning no score yet
+        self.rank = np.zeros((n_games, n_snakes), dtype=np.int64)
+        self.final_points = np.zeros((n_games, n_snakes), dtype=np.int64)
+        self.iter = np.zeros(n_games, dtype=np.int64)
+        self.done = np.ones(n_games, dtype=bool)
+
+    # Flat views, indexed by game * grid_size**2 + cell
+    def _flat(self, layer):
+        return layer.reshape(-1)
+
+    def _gameOffsets(self, games):
+        return games * self.grid_size ** 2
+
+    def reset(self):
+        """
+        Start every game from a random valid state, as Game.startingState does.
+        """
+        N, S, G = self.n_games, self.n_snakes, self.grid_size
+        self.count[:] = 0
+        self.owner[:] = -1
+        self.fruits[:] = 0
+        self.head_ptr[:] = 0
+        self.on_tail[:] = False
+        self.last_tail[:] = -1
+        self.alive[:] = True
+        self.rank[:] = 0
+        self.final_points[:] = 0
+        self.iter[:] = 0
+        self.done[:] = False
+
+        num_spawn_sections_row = int(math.ceil(math.sqrt(S))**2)
+        spawn_section_size = G // num_spawn_sections_row
+        assert G >= 3*num_spawn_sections_row, "Map Grid is too small to guarantee all snakes will be spawned without overlap"
+
+        assign = np.argsort(self.rng.random((N, num_spawn_sections_row ** 2)), axis=1)[:, :S]
+        hx = self.rng.integers(1, spawn_section_size - 1, size=(N, S)) + (assign // num_spawn_sections_row) * spawn_section_size
+        hy = self.rng.integers(1, spawn_section_size - 1, size=(N, S)) + (assign % num_spawn_sections_row) * spawn_section_size
+        d = self.rng.integers(0, len(DIRECTIONS), size=(N, S))
+
+        self.body[:, :, 0] = hx * G + hy
+        self.body[:, :, 1] = (hx + DELTAS[d, 0]) * G + (hy + DELTAS[d, 1])
+        self.length[:] = 2
+        self.points[:] = 2 * FRUIT_BONUS
+
+        games = np.repeat(np.arange(N), S)
+        snakes = np.tile(np.arange(S), N)
+        for k in range(2):
+            g = self._gameOffsets(games) + self.body[games, snakes, k]
+            self._flat(self.count)[g] += 1
+            self._flat(self.owner)[g] = snakes
+
+        for _ in range(self.fruit_ratio * S):
+            pending = np.arange(N)
+            while len(pending) > 0:
+                added = self._tryAddFruit(pending, FRUIT_VAL)
+                pending = pending[~added]
+        return self
+
+    def load(self, n, state):
+        """
+        Overwrite game `n` with a copy of `state` (a GameInterface.State).
+        """
+        G = self.grid_size
+        self.count[n] = 0
+        self.owner[n] = -1
+        self.fruits[n] = 0
+        self.alive[n] = False
+        self.on_tail[n] = False
+        self.last_tail[n] = -1
+        self.rank[n] = 0
+        self.final_points[n] = 0
+        self._reserve(max([len(s.position) for s in state.snakes.values()] + [0]) + 2)
+        for i, s in state.snakes.items():
+            cells = [x * G + y for x, y in s.position]
+            self.body[n, i, :len(cells)] = cells
+            self.head_ptr[n, i] = 0
+            self.length[n, i] = len(cells)
+            self.points[n, i] = s.points
+            self.on_tail[n, i] = s.on_tail
+            if s.last_tail is not None:
+                self.last_tail[n, i] = s.last_tail[0] * G + s.last_tail[1]
+            self.alive[n, i] = True
+            for c in cells:
+                self.count[n, c // G, c % G] += 1
+                self.owner[n, c // G, c % G] = i
+        for (x, y), v in state.fruits.items():
+            self.fruits[n, x, y] = v
+        for i, (rank, points) in state.scores.items():
+            self.rank[n, i] = rank
+            self.final_points[n, i] = points
+        self.iter[n] = state.iter
+        self.done[n] = self.alive[n].sum() <= 1 or (self.max_iter is not None and state.iter == self.max_iter)
+
+    def getState(self, n):
+        """
+        Build the GameInterface.State of game `n`, e.g. to run a python strategy or the GUI on it.
+        """
+        G = self.grid_size
+        occupancy = Occupancy(G)
+        snakes = {}
+        for i in np.nonzero(self.alive[n])[0]:
+            cells = self._body(n, i)
+            s = newSnake([(int(c) // G, int(c) % G) for c in cells], int(i), occupancy,
+                         compact=self.config.compact_bodies)
+            s.points = int(self.points[n, i])
+            s.on_tail = bool(self.on_tail[n, i])
+            if self.last_tail[n, i] >= 0:
+                s.last_tail = (int(self.last_tail[n, i]) // G, int(self.last_tail[n, i]) % G)
+            snakes[int(i)] = s
+        state = State(snakes, {}, occupancy, self.config)
+        for x, y in zip(*np.nonzero(self.fruits[n])):
+            state.addFruit((int(x), int(y)), int(self.fruits[n, x, y]))
+        state.scores = {int(i) : (int(self.rank[n, i]), int(self.final_points[n, i]))
+                        for i in np.nonzero(self.rank[n])[0]}
+        state.iter = int(self.iter[n])
+        return state
+
+    def _body(self, n, i):
+        idx = (self.head_ptr[n, i] + np.arange(self.length[n, i])) % self.capacity
+        return self.body[n, i, idx]
+
+    def _reserve(self, size):
+        """
+        Make sure ring buffers can hold `size` cells, unrolling them to start at 0 when growing.
+        """
+        if size <= self.capacity:
+            return
+        capacity = self.capacity
+        while capacity < size:
+            capacity *= 2
+        idx = (self.head_ptr[:, :, None] + np.arange(self.capacity)[None, None, :]) % self.capacity
+        body = np.zeros((self.n_games, self.n_snakes, capacity), dtype=np.int32)
+        body[:, :, :self.capacity] = np.take_along_axis(self.body, idx, axis=2)
+        self.body = body
+        self.head_ptr[:] = 0
+        self.capacity = capacity
+
+    def _segment(self, k):
+        """
+        Flat cell of the k-th segment of every snake, counting from the tail if k < 0.
+        """
+        if k >= 0:
+            idx = (self.head_ptr + k) % self.capacity
+        else:
+            idx = (self.head_ptr + self.length + k) % self.capacity
+        return np.take_along_axis(self.body, idx[..., None], axis=2)[..., 0]
+
+    def _ownCount(self, x, y, games, snakes):
+        """
+        Number of segments of `snakes` at (x,y) in `games`, 0 off the grid.
+        """
+        G = self.grid_size
+        on_grid = (x >= 0) & (y >= 0) & (x < G) & (y < G)
+        g = self._gameOffsets(games) + np.clip(x, 0, G - 1) * G + np.clip(y, 0, G - 1)
+        own = np.where(self._flat(self.owner)[g] == snakes, self._flat(self.count)[g], 0)
+        return np.where(on_grid, own, 0), on_grid
+
+    def _authorized(self, moves):
+        """
+        Vectorized newSnake.authorizedMove for `moves` of shape (n_games, n_snakes, ...).
+        """
+        G = self.grid_size
+        extra = (slice(None), slice(None)) + (None,) * (moves.ndim - 2)
+        games = np.arange(self.n_games)[:, None][extra]
+        snakes = np.arange(self.n_snakes)[None, :][extra]
+        head, second = self._segment(0)[extra], self._segment(1)[extra]
+        tail, before_tail = self._segment(-1)[extra], self._segment(-2)[extra]
+        hx, hy = head // G, head % G
+        dx, dy = DELTAS[moves, 0], DELTAS[moves, 1]
+
+        # backward moves are forbidden
+        backward = (dx == second // G - hx) & (dy == second % G - hy)
+
+        tx, ty = hx + dx, hy + dy
+        own, on_grid = self._ownCount(tx, ty, games, snakes)
+        target_hit = ~on_grid | (own - (tail == tx * G + ty) >= 1)
+
+        nx, ny = hx + 2 * dx, hy + 2 * dy
+        own, on_grid = self._ownCount(nx, ny, games, snakes)
+        next_hit = ~on_grid | (own - (tail == nx * G + ny) - (before_tail == nx * G + ny) >= 1)
+
+        return ~backward & ~(self.on_tail[extra] & target_hit) & ~(target_hit & next_hit)
+
+    def legalMoves(self):
+        """
+        (n_games, n_snakes, len(DIRECTIONS)) mask of the moves State.actions would return.
+        """
+        G = self.grid_size
+        moves = np.broadcast_to(np.arange(len(DIRECTIONS)), (self.n_games, self.n_snakes, len(DIRECTIONS)))
+        head = self._segment(0)[..., None]
+        tx, ty = head // G + DELTAS[moves, 0], head % G + DELTAS[moves, 1]
+        on_grid = (tx >= 0) & (ty >= 0) & (tx < G) & (ty < G)
+        active = self.alive & ~self.done[:, None]
+        return on_grid & self._authorized(moves) & active[..., None]
+
+    def randomMoves(self):
+        """
+        Vectorized randomStrategy: a uniformly drawn legal move, NO_MOVE if there is none.
+        """
+        legal = self.legalMoves()
+        draw = np.where(legal, self.rng.random(legal.shape), -1.)
+        return np.where(legal.any(axis=2), draw.argmax(axis=2), NO_MOVE)
+
+    def greedyMoves(self):
+        """
+        Vectorized greedyStrategy: the legal move getting closest to a fruit (Manhattan distance).
+        Ties are broken by DIRECTIONS order and games without fruits move randomly.
+        """
+        G = self.grid_size
+        legal = self.legalMoves()
+        dist = self.fruitDistances()
+        head = self._segment(0)[..., None]
+        tx = np.clip(head // G + DELTAS[:, 0], 0, G - 1)
+        ty = np.clip(head % G + DELTAS[:, 1], 0, G - 1)
+        games = np.arange(self.n_games)[:, None, None]
+        d = np.where(legal, dist[games, tx, ty], np.inf)
+        no_fruit = ~self.fruits.reshape(self.n_games, -1).any(axis=1)
+        moves = np.where(legal.any(axis=2), d.argmin(axis=2), NO_MOVE)
+        if no_fruit.any():
+            moves = np.where(no_fruit[:, None], self.randomMoves(), moves)
+        return moves
+
+    def fruitDistances(self):
+        """
+        Manhattan distance from every cell to the closest fruit (inf without fruits),
+        computed with separable forward/backward sweeps.
+        """
+        G = self.grid_size
+        dist = np.where(self.fruits > 0, 0., np.inf)
+        for axis in (1, 2):
+            dist = np.moveaxis(dist, axis, 0).copy()
+            for i in range(1, G):
+                np.minimum(dist[i], dist[i - 1] + 1, out=dist[i])
+            for i in range(G - 2, -1, -1):
+                np.minimum(dist[i], dist[i + 1] + 1, out=dist[i])
+            dist = np.moveaxis(dist, 0, axis)
+        return dist
+
+    def _tryAddFruit(self, games, val):
+        """
+        One attempt to add a fruit at a random cell of every game in `games`, as State.addFruit.
+        Returns the mask of games where the fruit was added.
+        """
+        cells = self.rng.integers(0, self.grid_size ** 2, size=len(games))
+        g = self._gameOffsets(games) + cells
+        added = (self._flat(self.count)[g] == 0) & (self._flat(self.fruits)[g] == 0)
+        self._flat(self.fruits)[g[added]] = val
+        return added
+
+    def _removeSnakes(self, games, snakes):
+        """
+        Remove one dead snake in each of `games`, dropping bonus fruits on its body
+        wherever no other snake and no fruit lie.
+        """
+        if len(games) == 0:
+            return
+        idx = (self.head_ptr[games, snakes][:, None] + np.arange(self.capacity)[None, :]) % self.capacity
+        cells = np.take_along_axis(self.body[games, snakes], idx, axis=1)
+        valid = np.arange(self.capacity)[None, :] < self.length[games, snakes][:, None]
+        g = (self._gameOffsets(games)[:, None] + cells)[valid]
+        count = self._flat(self.count)
+        np.subtract.at(count, g, 1)
+        free = count[g] == 0
+        self._flat(self.owner)[g[free]] = -1
+        fruits = self._flat(self.fruits)
+        fruits[g[free & (fruits[g] == 0)]] = FRUIT_BONUS
+        self.alive[games, snakes] = False
+
+    def update(self, moves):
+        """
+        `moves` is a (n_games, n_snakes) array of move indices.
+        Vectorized State.update on every running game.
+        """
+        G, S = self.grid_size, self.n_snakes
+        moves = np.asarray(moves)
+        active = ~self.done
+        alive = self.alive & active[:, None]
+        self.iter[active] += 1
+        self._reserve(int(self.length.max()) + 2)
+
+        has_move = moves >= 0
+        directions = np.where(has_move, moves, 0)
+        legal = has_move & self._authorized(directions)
+        illegal = alive & ~legal
+        n_m, s_m = np.nonzero(alive & legal)
+        offsets = self._gameOffsets(n_m)
+        count, owner, fruits = self._flat(self.count), self._flat(self.owner), self._flat(self.fruits)
+
+        # pop tails
+        tails = self._segment(-1)[n_m, s_m]
+        count[offsets + tails] -= 1
+        vacated = offsets + tails
+        owner[vacated[count[vacated] == 0]] = -1
+        self.last_tail[n_m, s_m] = tails
+        self.length[n_m, s_m] -= 1
+
+        # new heads, the first snake reaching a fruit collects it
+        head = self._segment(0)[n_m, s_m]
+        d = directions[n_m, s_m]
+        new_head = (head // G + DELTAS[d, 0]) * G + head % G + DELTAS[d, 1]
+        g = offsets + new_head
+        first = np.zeros(len(g), dtype=bool)
+        first[np.unique(g, return_index=True)[1]] = True
+        gained = np.where(first, fruits[g], 0)
+        fruits[g[gained > 0]] = 0
+        self.points[n_m, s_m] += gained
+        grow = (gained > 0) & (self.points[n_m, s_m] // FRUIT_BONUS > self.length[n_m, s_m] + 1)
+
+        # snakes which grow keep their tail
+        regrown = offsets[grow] + tails[grow]
+        count[regrown] += 1
+        owner[regrown] = s_m[grow]
+        self.length[n_m[grow], s_m[grow]] += 1
+
+        own = np.where(owner[g] == s_m, count[g], 0)
+        self.on_tail[n_m, s_m] = own > 0
+        free = count[g] == 0
+        np.add.at(count, g, 1)
+        owner[g[free]] = s_m[free]
+        self.head_ptr[n_m, s_m] = (self.head_ptr[n_m, s_m] - 1) % self.capacity
+        self.body[n_m, s_m, self.head_ptr[n_m, s_m]] = new_head
+        self.length[n_m, s_m] += 1
+
+        # remove snakes which bumped into other snakes
+        collided = np.zeros((self.n_games, S), dtype=bool)
+        collided[n_m, s_m] = count[g] - own - 1 > 0
+        dead = illegal | collided
+
+        # save scores and add fruits, in the order State.update processes deads
+        rank = alive.sum(axis=1)
+        self.rank[dead] = np.broadcast_to(rank[:, None], dead.shape)[dead]
+        self.final_points[dead] = self.points[dead]
+        order = np.argsort(np.where(illegal, 0, S) + np.arange(S)[None, :] + np.where(dead, 0, 2 * S), axis=1, kind='stable')
+        n_dead = dead.sum(axis=1)
+        for k in range(S):
+            games = np.nonzero(n_dead > k)[0]
+            self._removeSnakes(games, order[games, k])
+
+        remaining = self.alive.sum(axis=1)
+        winner = active & (remaining == 1)
+        w = self.alive[winner].argmax(axis=1)
+        winner = np.nonzero(winner)[0]
+        self.rank[winner, w] = 1
+        self.final_points[winner, w] = self.points[winner, w]
+
+        ended = remaining <= 1
+        if self.max_iter:
+            ended |= self.iter == self.max_iter
+        self.done |= active & ended
+        return active
+
+    def step(self, moves):
+        """
+        Vectorized Game.tick: update every running game and try to add a fruit in each.
+        """
+        active = self.update(moves)
+        self._tryAddFruit(np.nonzero(active)[0], FRUIT_VAL)
+        return self.done
+
+    def run(self, policy = None):
+        """
+        Play every game until the end, `policy` mapping the BatchGame to moves (randomMoves by default).
+        """
+        if policy is None:
+            policy = BatchGame.randomMoves
+        while not self.done.all():
+            self.step(policy(self))
+        return self
+
+    def results(self):
+        """
+        Aggregate finished games like simulation.simulate: wins, points, scores, iterations.
+        """
+        winner = (self.alive.sum(axis=1) == 1)
+        w = self.alive.argmax(axis=1)
+        wins = dict((id, float(np.mean(winner & (w == id)))) for id in range(self.n_snakes))
+        points = dict((id, self.points[winner & (w == id), id].tolist()) for id in range(self.n_snakes))
+        points = dict((id, sum(val)/len(val) if val else 0.) for id,val in points.items())
+        scores = dict((id, [(int(r), int(p)) for r, p in zip(self.rank[:, id], self.final_points[:, id]) if r > 0])
+                      for id in range(self.n_snakes))
+        return wins, points, scores, self.iter.tolist()
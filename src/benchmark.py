@@ -0,0 +1,231 @@
+'''
+MIT License
+
+Copyright (c) 2018 Sebastien Dubois, Sebastien Levy, Felix Crevier
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+"""
+Benchmarks of the engine, the strategies and the feature extractor, written as JSON and compared
+against a baseline to flag regressions.
+
+    python benchmark.py [--quick] [--filter NAME] [--out FILE] [--baseline FILE] [--save-baseline] [--tolerance T]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import timeit
+import inspect
+import argparse
+import platform
+import subprocess
+import numpy as np
+
+import strategies
+from GameInterface import Game
+from features import FeatureExtractor
+from headless import runHeadless
+from constants import MOVES, OpportunistAgent, GreedyAgent, SimpleHC, WeightedHC1
+
+DEFAULT_BASELINE = os.path.join("experiments", "benchmark_baseline.json")
+MACRO_AGENTS = [OpportunistAgent, GreedyAgent, SimpleHC, WeightedHC1]
+
+def midGameState(grid_size, num_snakes, n_ticks = 40, seed = 0):
+    """
+    Deterministic state after `n_ticks` ticks of a game between opportunists (fewer if it ends).
+    """
+    random.seed(seed)
+    np.random.seed(seed)
+    game = Game(grid_size, num_snakes)
+    state = game.start([OpportunistAgent] * num_snakes)
+    # opportunists all get their id from start(): play with the strategy directly
+    for _ in range(n_ticks):
+        actions = {id_: strategies.opportunistStrategy(id_, state) for id_ in state.snakes}
+        next_state = game.tick(state, actions)
+        if game.isEnd(next_state):
+            break
+        state = next_state
+    return state
+
+def measure(fn, repeat, number):
+    """
+    Time `number` calls of fn, `repeat` times. Returns the median and min time per call, in microseconds.
+    """
+    times = timeit.Timer(fn).repeat(repeat = repeat, number = number)
+    per_call = [1e6 * t / number for t in times]
+    return {"median_us": float(np.median(per_call)), "min_us": float(min(per_call)),
+            "repeat": repeat, "number": number}
+
+def microBenchmarks(quick = False):
+    """
+    {name => fn} of the micro benchmarks, on a mid-game state of a 30x30 grid with 4 snakes.
+    """
+    state = midGameState(30, 4)
+    ids = list(state.snakes.keys())
+    id_ = ids[0]
+    snake = state.snakes[id_]
+    actions = {i: state.actions(i)[0] if state.actions(i) else None for i in ids}
+    extractor = FeatureExtractor(id_, state.grid_size, 16)
+    candidates = state.actions(id_)
+
+    def update():
+        state.reverseUpdate(state.journaledUpdate(actions))
+
+    def coldActions():
+        for i in ids:
+            state.snakes[i].legal_cache.clear()
+            state.actions(i)
+
+    def cachedActions():
+        for i in ids:
+            state.actions(i)
+
+    def authorized():
+        for m in MOVES:
+            snake.authorizedMove(m)
+
+    def arrayExtractor():
+        for a in candidates:
+            extractor.arrayExtractor(state, a)
+
+    def sparseMatrixExtractor():
+        extractor.sparseMatrixExtractor([extractor.dictExtractor(state, a) for a in candidates])
+
+    def sparseBatchExtractor():
+        extractor.sparseBatchExtractor(state, {id_: candidates})
+
+    benchmarks = {
+        "State.update (journaled, with reverse)": update,
+        "State.actions (cold, all snakes)": coldActions,
+        "State.actions (cached, all snakes)": cachedActions,
+        "newSnake.authorizedMove (all MOVES)": authorized,
+        "FeatureExtractor.arrayExtractor (all actions)": arrayExtractor,
+        "FeatureExtractor.sparseMatrixExtractor (all actions)": sparseMatrixExtractor,
+        "FeatureExtractor.sparseBatchExtractor (all actions)": sparseBatchExtractor,
+    }
+    for name, strategy in inspect.getmembers(strategies, inspect.isfunction):
+        if "Strategy" in name and name != "humanStrategy" and strategy.__module__ == strategies.__name__:
+            benchmarks["strategies.{}".format(name)] = (lambda s: lambda: [s(i, state) for i in ids])(strategy)
+    return benchmarks
+
+def macroBenchmarks(quick = False):
+    """
+    {name => (fn, ticks)} of full headless games: fn plays the games and returns their number of ticks.
+    """
+    benchmarks = {}
+    sizes = [20, 30] if quick else [20, 30, 50]
+    counts = [2, 4]
+    n_games = 2 if quick else 5
+    for grid_size in sizes:
+        for num_snakes in counts:
+            def play(grid_size = grid_size, num_snakes = num_snakes):
+                ticks = 0
+                for seed in range(n_games):
+                    random.seed(seed)
+                    np.random.seed(seed)
+                    agents = [MACRO_AGENTS[i % len(MACRO_AGENTS)] for i in range(num_snakes)]
+                    state, _ = runHeadless(agents, grid_size, max_iter = 300)
+                    ticks += state.iter
+                return ticks
+            benchmarks["game {}x{} {} snakes".format(grid_size, grid_size, num_snakes)] = play
+    return benchmarks
+
+def run(quick = False, name_filter = None):
+    repeat, number = (3, 50) if quick else (7, 200)
+    results = {}
+    for name, fn in microBenchmarks(quick).items():
+        if name_filter and name_filter not in name:
+            continue
+        random.seed(0)
+        results[name] = measure(fn, repeat, number)
+        print("{:<60} {:>12.1f} us".format(name, results[name]["median_us"]))
+    for name, play in macroBenchmarks(quick).items():
+        if name_filter and name_filter not in name:
+            continue
+        times = []
+        for _ in range(1 if quick else 3):
+            start = time.perf_counter()
+            ticks = play()
+            times.append(1e6 * (time.perf_counter() - start) / ticks)
+        # macro benchmarks are reported per tick, to stay comparable if games change length
+        results[name] = {"median_us": float(np.median(times)), "min_us": float(min(times)), "ticks": ticks}
+        print("{:<60} {:>12.1f} us/tick".format(name, results[name]["median_us"]))
+    return results
+
+def environment():
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr = subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"python": platform.python_version(), "numpy": np.__version__, "machine": platform.machine(),
+            "processor": platform.processor(), "commit": commit, "date": time.strftime("%Y-%m-%d %H:%M:%S")}
+
+def compare(results, baseline, tolerance = 0.2):
+    """
+    Benchmarks slower than the baseline by more than `tolerance` (relative, on the median):
+    list of (name, baseline us, current us, ratio). Prints the comparison of every benchmark.
+    """
+    regressions = []
+    print("\n{:<60} {:>12} {:>12} {:>8}".format("benchmark", "baseline", "current", "ratio"))
+    for name, res in results.items():
+        if name not in baseline:
+            print("{:<60} {:>12} {:>12.1f} {:>8}".format(name, "-", res["median_us"], "new"))
+            continue
+        ratio = res["median_us"] / baseline[name]["median_us"]
+        flag = ""
+        if ratio > 1 + tolerance:
+            regressions.append((name, baseline[name]["median_us"], res["median_us"], ratio))
+            flag = "  REGRESSION"
+        print("{:<60} {:>12.1f} {:>12.1f} {:>8.2f}{}".format(name, baseline[name]["median_us"], res["median_us"], ratio, flag))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Benchmarks of the engine, strategies and features")
+    parser.add_argument("--quick", action = "store_true", help = "fewer repetitions and smaller games")
+    parser.add_argument("--filter", default = None, help = "only run benchmarks whose name contains this")
+    parser.add_argument("--out", default = None, help = "JSON file for the results")
+    parser.add_argument("--baseline", default = DEFAULT_BASELINE, help = "JSON results to compare with")
+    parser.add_argument("--save-baseline", action = "store_true", help = "store the results as the baseline")
+    parser.add_argument("--tolerance", type = float, default = 0.2, help = "relative slowdown flagged as a regression")
+    args = parser.parse_args()
+
+    report = {"environment": environment(), "quick": args.quick, "results": run(args.quick, args.filter)}
+    if args.out:
+        with open(args.out, "w") as fout:
+            json.dump(report, fout, indent = 2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as fout:
+            json.dump(report, fout, indent = 2)
+        print("\nBaseline saved in", args.baseline)
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as fin:
+            baseline = json.load(fin)
+        if baseline.get("quick") != args.quick:
+            print("\nWarning: the baseline was run with quick = {}".format(baseline.get("quick")))
+        regressions = compare(report["results"], baseline["results"], args.tolerance)
+        if regressions:
+            print("\n{} regression(s) above {:.0%}".format(len(regressions), args.tolerance))
+            sys.exit(1)
+    else:
+        print("\nNo baseline in {} (run with --save-baseline to store one)".format(args.baseline))
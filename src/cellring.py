@@ -0,0 +1,147 @@
+'''
+MIT License
+
+Copyright (c) 2018 Sebastien Dubois, Sebastien Levy, Felix Crevier
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+"""
+Compact snake bodies stored as flat cell indices
+"""
+
+class CellRing:
+    """
+    Drop-in replacement for the deque of (x, y) positions of a snake: cells are stored as flat
+    indices in a circular list, index 0 being the head. Indexing any segment is O(1) and copies
+    are a single list copy. Positions read from the ring are the interned tuples of `positions`,
+    so reading them allocates nothing.
+    Flat indices are (x + PAD) * width + (y + PAD) with width = grid_size + 2 * PAD, i.e. the
+    x-major layout of occupancy.Occupancy on a grid with a border of PAD cells, since a snake's head
+    can go up to PAD cells off the grid before it dies (or in a pretended move).
+    """
+
+    PAD = 2
+    _tables = {}    # grid_size => tuple of the position of each flat index
+
+    def __init__(self, positions, grid_size, capacity = 8):
+        self.grid_size = grid_size
+        self.width = grid_size + 2 * self.PAD
+        self.positions = self.positionTable(grid_size)
+        positions = list(positions)
+        while capacity < len(positions):
+            capacity *= 2
+        self.cells = [0] * capacity
+        self.start = 0
+        self.n = 0
+        for pos in positions:
+            self.append(pos)
+
+    @classmethod
+    def positionTable(cls, grid_size):
+        if grid_size not in cls._tables:
+            r = range(-cls.PAD, grid_size + cls.PAD)
+            cls._tables[grid_size] = tuple((x, y) for x in r for y in r)
+        return cls._tables[grid_size]
+
+    def _grow(self):
+        cap = len(self.cells)
+        self.cells = [self.cells[(self.start + i) % cap] for i in range(self.n)] + [0] * cap
+        self.start = 0
+
+    def cell(self, i):
+        """
+        Flat index of segment i (negative i counts from the tail).
+        """
+        if i < 0:
+            i += self.n
+        if not 0 <= i < self.n:
+            raise IndexError("CellRing index out of range")
+        return self.cells[(self.start + i) % len(self.cells)]
+
+    def toCell(self, pos):
+        return (pos[0] + self.PAD) * self.width + pos[1] + self.PAD
+
+    def shiftedHead(self, direction):
+        """
+        Flat index of the cell one step from the head along `direction`, computed from the head's
+        cell without going through a position.
+        """
+        return self.cell(0) + direction[0] * self.width + direction[1]
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.n
+        if not 0 <= i < self.n:
+            raise IndexError("CellRing index out of range")
+        return self.positions[self.cells[(self.start + i) % len(self.cells)]]
+
+    def __iter__(self):
+        cells, cap, positions = self.cells, len(self.cells), self.positions
+        for i in range(self.n):
+            yield positions[cells[(self.start + i) % cap]]
+
+    def appendleft(self, pos):
+        self.appendleftCell(self.toCell(pos))
+
+    def appendleftCell(self, cell):
+        if self.n == len(self.cells):
+            self._grow()
+        self.start = (self.start - 1) % len(self.cells)
+        self.cells[self.start] = cell
+        self.n += 1
+
+    def append(self, pos):
+        if self.n == len(self.cells):
+            self._grow()
+        self.cells[(self.start + self.n) % len(self.cells)] = self.toCell(pos)
+        self.n += 1
+
+    def popleft(self):
+        if self.n == 0:
+            raise IndexError("pop from an empty CellRing")
+        cell = self.cells[self.start]
+        self.start = (self.start + 1) % len(self.cells)
+        self.n -= 1
+        return self.positions[cell]
+
+    def pop(self):
+        if self.n == 0:
+            raise IndexError("pop from an empty CellRing")
+        self.n -= 1
+        return self.positions[self.cells[(self.start + self.n) % len(self.cells)]]
+
+    def __deepcopy__(self, memo):
+        copy = CellRing.__new__(CellRing)
+        copy.grid_size = self.grid_size
+        copy.width = self.width
+        copy.positions = self.positions
+        copy.cells = self.cells[:]
+        copy.start = self.start
+        copy.n = self.n
+        return copy
+
+    def __eq__(self, other):
+        return len(self) == len(other) and all(p == q for p, q in zip(self, other))
+
+    def __repr__(self):
+        return "CellRing({})".format(list(self))
@@ -24,10 +24,14 @@ SOFTWARE.
 
 from constants import *
 from hp import *
+from minimax import survivorDfunc
 agent             = "simplestrategies"
 filename          = "nonrlrun"
 game_hp           = HP(grid_size = 50, max_iter = None, discount = 0.9)
 depth             = lambda s,a : survivorDfunc(s, a , 2, 0.5)
 num_trials        = 50
+num_workers       = 1
+seed              = None
+profile           = False       # time the phases of the ticks (see instrument.py)
 opponents         = [RandomAgent, GreedyAgent]
 comment           = ""
@@ -22,18 +22,14 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 '''
 
-from move import Move
+from functools import partial
+from move import Move, ACCELERATION, DIRECTIONS, NORM_MOVES, MOVES, NO_MOVE
 from agent import Agent
 from strategies import *
+from minimax import MinimaxStrategy
+from mcts import MCTSStrategy
 
 # global variables
-ACCELERATION = False
-DIRECTIONS = [(1,0), (0,1), (-1,0), (0,-1)]      # authorized moves
-NORM_MOVES = [1]
-if ACCELERATION:
-    NORM_MOVES.append(2)                    # acceleration moves
-MOVES = [Move(dir, norm) for dir in DIRECTIONS for norm in NORM_MOVES]
-NO_MOVE = Move(direction = (0,0), norm = 0)
 FRUIT_VAL = 1                               # default fruit value
 FRUIT_BONUS = 3                             # fruit value for dead snakes
 
@@ -45,4 +41,10 @@ WeightedHCPoint5 = Agent(name = "WeightedHCPoint5", strategy=weightedHillClimbin
 WeightedHCPoint33 = Agent(name = "WeightedHCPoint33", strategy=weightedHillClimbingStrategyPoint33)
 GreedyAgent = Agent(name = "GreedyAgent", strategy = greedyStrategy)
 OpportunistAgent = Agent(name = "OpportunistAgent", strategy = opportunistStrategy)
-
+PathGreedyAgent = Agent(name = "PathGreedyAgent", strategy = partial(greedyStrategy, paths = True))
+PathOpportunistAgent = Agent(name = "PathOpportunistAgent", strategy = partial(opportunistStrategy, paths = True))
+PathSimpleHC = Agent(name = "PathSimpleHC", strategy = partial(simpleHillClimbingStrategy, paths = True))
+SpaceAwareAgent = Agent(name = "SpaceAwareAgent", strategy = spaceAwareStrategy)
+MinimaxAgent = Agent(name = "MinimaxAgent", strategy = MinimaxStrategy(depth = 4, time_budget = 0.05))
+ExpectimaxAgent = Agent(name = "ExpectimaxAgent", strategy = MinimaxStrategy(depth = 4, time_budget = 0.05, mode = "expectimax"))
+MCTSAgent = Agent(name = "MCTSAgent", strategy = MCTSStrategy(time_budget = 0.1))
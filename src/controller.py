@@ -23,18 +23,29 @@ SOFTWARE.
 '''
 
 import sys, pickle
-import pygame
-import gui, move, config
+import move, config
 from GameInterface import Game,Snake
+from headless import runHeadless
+from replay import ReplayWriter
+from instrument import clock
 from strategies import randomStrategy, humanStrategy
-from features import FeatureExtractor
 from pdb import set_trace as t
 from constants import *
 
-def controller(strategies, grid_size, fruit_ratio = 1., max_iter = None, verbose = 0, gui_active = False, game_speed = None):
+def controller(strategies, grid_size, fruit_ratio = 1., max_iter = None, verbose = 0, gui_active = False, game_speed = None,
+               replay_path = None, profiler = None):
+    # Record the game in a binary replay if asked
+    replay = ReplayWriter(replay_path) if replay_path is not None else None
+
+    # Without GUI nor pause, run the game loop that doesn't depend on pygame
+    if not gui_active and not game_speed:
+        return runHeadless(strategies, grid_size, fruit_ratio = fruit_ratio, max_iter = max_iter, replay = replay,
+                           profiler = profiler)[0]
+
     # Pygame Init
+    import pygame, gui
     pygame.init()
-    clock = pygame.time.Clock()
+    fps_clock = pygame.time.Clock()
     if gui_active:
         gui_options = gui.Options()
         win = gui.Window(grid_size,'Multiplayer Snake', gui_options)
@@ -42,8 +53,11 @@ def controller(strategies, grid_size, fruit_ratio = 1., max_iter = None, verbose
 
     # Start Game
     game = Game(grid_size, len(strategies), fruit_ratio = fruit_ratio, max_iter = max_iter)
+    game.profiler = profiler
     # state = game.startState()
     state = game.start(strategies)
+    if replay is not None:
+        replay.start(game, state)
     prev_human_action = None
     game_over = False
 
@@ -103,9 +117,11 @@ def controller(strategies, grid_size, fruit_ratio = 1., max_iter = None, verbose
         # Update the state
         if not game_over:
             state = game.tick(state, actions, copy = False)
+            if replay is not None:
+                replay.record(game, actions, state)
         # Pause
         if game_speed:
-            clock.tick(game_speed)
+            fps_clock.tick(game_speed)
 
         # Check if game over
         game_over = game.isEnd(state)
@@ -114,12 +130,18 @@ def controller(strategies, grid_size, fruit_ratio = 1., max_iter = None, verbose
 
         # Update gui
         if gui_active:
+            if profiler is not None:
+                start = clock()
             win.updateSprites(state)
             win.refresh()
+            if profiler is not None:
+                profiler.record("render", clock() - start)
 
     #if verbose > 0:
         #state.printGrid(game.grid_size)
 
+    if replay is not None:
+        replay.close()
     return state
 
 if __name__ ==  "__main__":
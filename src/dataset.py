@@ -0,0 +1,309 @@
+'''
+MIT License
+
+Copyright (c) 2018 Sebastien Dubois, Sebastien Levy, Felix Crevier
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+"""
+Offline datasets of transitions (features, action, reward, next features), built from replays or
+simulations and stored in memory-mapped shards
+"""
+
+import os
+import sys
+import glob
+import json
+import numpy as np
+from scipy.sparse import csr_matrix, vstack
+from GameInterface import Game
+from features import FeatureExtractor
+from replay import ReplayReader
+from move import toMove
+
+# arrays of a shard, saved as <name>.npy in the shard directory
+#   features_*      CSR of the features of (state, action) of every transition
+#   next_*          CSR of the features of (next state, action) for every legal action of the next state
+#                   ([None], i.e. 'trapped', if the snake has none), rows next_ptr[i]:next_ptr[i+1] of
+#                   transition i (none if it is done), next_actions being their move ids (-1 for None)
+SHARD_ARRAYS = ["features_indptr", "features_indices", "features_data", "actions", "rewards", "dones",
+                "snakes", "games", "ticks", "next_ptr", "next_indptr", "next_indices", "next_data", "next_actions"]
+
+def moveId(m):
+    m = toMove(m)
+    return -1 if m is None else m.id
+
+def candidateActions(state):
+    """
+    {snake id => legal moves of the snake, [None] if it is trapped} for the snakes of `state`.
+    """
+    return {id_: (state.actions(id_) or [None]) for id_ in state.snakes}
+
+def gatherRanges(ptr, rows):
+    """
+    Concatenation of the ranges ptr[r]:ptr[r+1] of `rows`, and the offsets of each range in it.
+    """
+    starts = np.asarray(ptr[rows], dtype=np.int64)
+    lengths = np.asarray(ptr[rows + 1], dtype=np.int64) - starts
+    offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return np.repeat(starts - offsets[:-1], lengths) + np.arange(offsets[-1]), offsets
+
+def csrRows(indptr, indices, data, rows, n_features):
+    """
+    CSR matrix of `rows` of the CSR arrays (possibly memory-mapped), read without loading the rest.
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    gather, new_indptr = gatherRanges(indptr, rows)
+    return csr_matrix((np.asarray(data[gather]), np.asarray(indices[gather]), new_indptr),
+                      shape=(len(rows), n_features))
+
+
+class TransitionWriter:
+    """
+    Collects transitions and writes them in shards of `shard_size` transitions under `path`
+    (shard_00000/, shard_00001/, ... and meta.json written by close()).
+    Features are those of FeatureExtractor.sparseBatchExtractor with the given `radius`.
+    """
+
+    def __init__(self, path, grid_size, radius = 16, shard_size = 100000):
+        self.path = path
+        self.grid_size = grid_size
+        self.radius = radius
+        self.shard_size = shard_size
+        self.extractor = FeatureExtractor(0, grid_size, radius)
+        self.n_features = self.extractor.nFeatures()
+        self.shards = []
+        self.n_games = 0
+        os.makedirs(path, exist_ok = True)
+        self.reset()
+
+    def reset(self):
+        self.features = []
+        self.next = []
+        self.columns = dict((name, []) for name in ["actions", "rewards", "dones", "snakes", "games", "ticks"])
+
+    def __len__(self):
+        return len(self.columns["actions"])
+
+    def add(self, features, action, reward, done, snake, tick, next_features = None, next_actions = ()):
+        """
+        Add a transition of snake `snake` at tick `tick` of the current game: `features` and
+        `next_features` are CSR rows (1 row, and one per next action).
+        """
+        self.features.append(features)
+        self.next.append(next_features)
+        for name, value in zip(["actions", "rewards", "dones", "snakes", "games", "ticks"],
+                               [action, reward, done, snake, self.n_games, tick]):
+            self.columns[name].append(value)
+        if next_features is not None:
+            self.columns.setdefault("next_actions", []).extend(next_actions)
+        if len(self) >= self.shard_size:
+            self.flush()
+
+    def actionFeatures(self, state, actions):
+        """
+        {snake id => CSR row of (state, action)} for `actions` {snake id => move}, to call before the tick.
+        """
+        ids = list(actions.keys())
+        matrix = self.extractor.sparseBatchExtractor(state, dict((id_, [actions[id_]]) for id_ in ids))
+        return dict((id_, matrix[k]) for k, id_ in enumerate(ids))
+
+    def candidateFeatures(self, state):
+        """
+        {snake id => (CSR rows, move ids)} of every candidate action of the snakes of `state`.
+        """
+        candidates = candidateActions(state)
+        matrix = self.extractor.sparseBatchExtractor(state, candidates)
+        result, n = {}, 0
+        for id_, moves in candidates.items():
+            result[id_] = (matrix[n:n+len(moves)], [moveId(m) for m in moves])
+            n += len(moves)
+        return result
+
+    def addTick(self, game, state, actions, features, tick):
+        """
+        Add the transitions of tick `tick` of the current game, which led to `state` with `actions`,
+        `features` being actionFeatures of the state before the tick. Rewards come from
+        game.agentLastReward, so the game must know the last tick (e.g. Game.tick with a journal).
+        """
+        game_over = game.isEnd(state)
+        candidates = self.candidateFeatures(state) if not game_over else {}
+        for id_, m in actions.items():
+            done = game_over or not state.isAlive(id_)
+            next_rows, next_ids = (None, ()) if done else candidates[id_]
+            self.add(features[id_], moveId(m), game.agentLastReward(id_), done, id_, tick, next_rows, next_ids)
+
+    def endGame(self):
+        self.n_games += 1
+
+    def flush(self):
+        """
+        Write the collected transitions as a new shard.
+        """
+        if len(self) == 0:
+            return
+        name = "shard_{:05d}".format(len(self.shards))
+        os.makedirs(os.path.join(self.path, name), exist_ok = True)
+        features = self.stack(self.features)
+        next_rows = [m for m in self.next if m is not None]
+        next_features = self.stack(next_rows)
+        next_ptr = np.zeros(len(self) + 1, dtype=np.int64)
+        np.cumsum([0 if m is None else m.shape[0] for m in self.next], out=next_ptr[1:])
+        arrays = {
+            "features_indptr": features.indptr.astype(np.int64),
+            "features_indices": features.indices.astype(np.int32),
+            "features_data": features.data.astype(np.float32),
+            "actions": np.array(self.columns["actions"], dtype=np.int16),
+            "rewards": np.array(self.columns["rewards"], dtype=np.float32),
+            "dones": np.array(self.columns["dones"], dtype=bool),
+            "snakes": np.array(self.columns["snakes"], dtype=np.int16),
+            "games": np.array(self.columns["games"], dtype=np.int32),
+            "ticks": np.array(self.columns["ticks"], dtype=np.int32),
+            "next_ptr": next_ptr,
+            "next_indptr": next_features.indptr.astype(np.int64),
+            "next_indices": next_features.indices.astype(np.int32),
+            "next_data": next_features.data.astype(np.float32),
+            "next_actions": np.array(self.columns.get("next_actions", []), dtype=np.int16),
+        }
+        for key in SHARD_ARRAYS:
+            np.save(os.path.join(self.path, name, key + ".npy"), arrays[key])
+        self.shards.append({"name": name, "size": len(self)})
+        self.reset()
+
+    def stack(self, rows):
+        if len(rows) == 0:
+            return csr_matrix((0, self.n_features))
+        return vstack(rows, format="csr")
+
+    def close(self):
+        self.flush()
+        meta = {"grid_size": self.grid_size, "radius": self.radius, "n_features": self.n_features,
+                "n_games": self.n_games, "shards": self.shards}
+        with open(os.path.join(self.path, "meta.json"), "w") as fout:
+            json.dump(meta, fout, indent = 2)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def fromReplay(writer, path):
+    """
+    Add the transitions of the game recorded in replay file `path`.
+    """
+    with ReplayReader(path) as reader:
+        config = reader.config
+        game = Game(config.grid_size, config.num_snakes, config.fruit_ratio, config.max_iter, config.compact_bodies)
+        state = reader.stateAt(0)
+        game.current_state = state
+        for t in range(len(reader)):
+            actions = reader.movesAt(t)
+            features = writer.actionFeatures(state, actions)
+            state.beginJournal()
+            reader.step(state, t)
+            game.last_changes = state.endJournal()
+            writer.addTick(game, state, actions, features, t)
+    writer.endGame()
+
+def fromSimulation(writer, agents, n_games, fruit_ratio = 1., max_iter = 500):
+    """
+    Add the transitions of `n_games` games between `agents`, played on the writer's grid.
+    """
+    for _ in range(n_games):
+        game = Game(writer.grid_size, len(agents), fruit_ratio = fruit_ratio, max_iter = max_iter)
+        state = game.start(agents)
+        while not game.isEnd(state):
+            actions = game.agentActions()
+            features = writer.actionFeatures(state, actions)
+            state = game.tick(state, actions, copy = False, journal = True)
+            writer.addTick(game, state, actions, features, state.iter - 1)
+        writer.endGame()
+
+
+class TransitionDataset:
+    """
+    Dataset written by a TransitionWriter. Shards are memory-mapped, and minibatches only read
+    the rows they need.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as fin:
+            self.meta = json.load(fin)
+        self.n_features = self.meta["n_features"]
+        self.sizes = [shard["size"] for shard in self.meta["shards"]]
+
+    def __len__(self):
+        return sum(self.sizes)
+
+    def shard(self, k):
+        """
+        Dict of the memory-mapped arrays of shard k.
+        """
+        name = self.meta["shards"][k]["name"]
+        return dict((key, np.load(os.path.join(self.path, name, key + ".npy"), mmap_mode="r")) for key in SHARD_ARRAYS)
+
+    def batch(self, shard, rows):
+        """
+        Minibatch of transitions `rows` of a shard: features (CSR), actions, rewards, dones, and the
+        next features (CSR) of all the transitions, next_ptr giving the rows of each transition.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        next_rows, next_ptr = gatherRanges(shard["next_ptr"], rows)
+        return {
+            "features": csrRows(shard["features_indptr"], shard["features_indices"], shard["features_data"],
+                                rows, self.n_features),
+            "actions": np.asarray(shard["actions"][rows]),
+            "rewards": np.asarray(shard["rewards"][rows]),
+            "dones": np.asarray(shard["dones"][rows]),
+            "next_features": csrRows(shard["next_indptr"], shard["next_indices"], shard["next_data"],
+                                     next_rows, self.n_features),
+            "next_actions": np.asarray(shard["next_actions"][next_rows]),
+            "next_ptr": next_ptr,
+        }
+
+    def minibatches(self, batch_size, shuffle = True, seed = None):
+        """
+        Iterate over the dataset by minibatches of `batch_size` transitions. With `shuffle`, shards
+        and transitions within a shard are visited in random order; a single shard is mapped at a time.
+        """
+        rng = np.random.default_rng(seed)
+        order = rng.permutation(len(self.sizes)) if shuffle else range(len(self.sizes))
+        for k in order:
+            shard = self.shard(k)
+            rows = rng.permutation(self.sizes[k]) if shuffle else np.arange(self.sizes[k])
+            for start in range(0, len(rows), batch_size):
+                yield self.batch(shard, np.sort(rows[start:start + batch_size]))
+
+
+if __name__ == "__main__":
+    # python dataset.py <output dir> <replay files...>
+    out, paths = sys.argv[1], sys.argv[2:]
+    if len(paths) == 1 and os.path.isdir(paths[0]):
+        paths = sorted(glob.glob(os.path.join(paths[0], "*.replay")))
+    with ReplayReader(paths[0]) as reader:
+        grid_size = reader.config.grid_size
+    with TransitionWriter(out, grid_size) as writer:
+        for path in paths:
+            fromReplay(writer, path)
+    print("{} transitions from {} games in {}".format(len(TransitionDataset(out)), len(paths), out))
@@ -0,0 +1,135 @@
+'''
+MIT License
+
+Copyright (c) 2018 Sebastien Dubois, Sebastien Levy, Felix Crevier
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+"""
+Gym-style multi-agent environments
+"""
+
+import numpy as np
+from GameInterface import Game
+from agent import Agent
+from features import FeatureExtractor
+from strategies import humanStrategy
+from constants import MOVES, NO_MOVE
+
+class SnakeEnv:
+    """
+    Game where snakes 0..n_agents-1 are driven through reset/step and the following ones by `opponents`.
+    Actions are move ids, i.e. indices in MOVES (-1 or None when the snake can't move), observations are the
+    FeatureExtractor arrays of the current state (no move) and rewards come from Game.agentLastReward.
+    """
+
+    def __init__(self, grid_size, n_agents = 1, opponents = [], fruit_ratio = 1, max_iter = None, radius = 16):
+        self.grid_size = grid_size
+        self.n_agents = n_agents
+        self.opponents = opponents
+        self.game = Game(grid_size, n_agents + len(opponents), fruit_ratio = fruit_ratio, max_iter = max_iter)
+        self.extractors = [FeatureExtractor(i, grid_size, radius) for i in range(n_agents)]
+        self.n_features = self.extractors[0].nFeatures()
+        self.n_actions = len(MOVES)
+        self.state = None
+
+    def reset(self, obs = None):
+        """
+        Start a new game. Returns the observations of the agents (written in `obs` if given).
+        """
+        agents = [Agent(name = "env-{}".format(i), strategy = humanStrategy) for i in range(self.n_agents)]
+        self.state = self.game.start(agents + list(self.opponents))
+        return self.observe(obs)
+
+    def observe(self, obs = None):
+        """
+        (n_agents, n_features) observations, written in `obs` if given. Dead agents only see 'trapped'.
+        """
+        if obs is None:
+            obs = np.zeros((self.n_agents, self.n_features))
+        for i, extractor in enumerate(self.extractors):
+            action = NO_MOVE if self.state.isAlive(i) else None
+            extractor.arrayExtractor(self.state, action, out = obs[i])
+        return obs
+
+    def step(self, actions, obs = None, rewards = None, dones = None):
+        """
+        Play one tick with `actions` for the agents and the opponents' strategies.
+        Returns observations, rewards, dones (agent dead or game over) and the state,
+        writing in the given buffers if any.
+        """
+        if rewards is None:
+            rewards = np.zeros(self.n_agents)
+        if dones is None:
+            dones = np.zeros(self.n_agents, dtype=bool)
+        moves = {}
+        for i in self.state.snakes.keys():
+            if i < self.n_agents:
+                moves[i] = actions[i]
+            else:
+                moves[i] = self.game.agents[i].nextAction(self.state)
+        alive = [self.state.isAlive(i) for i in range(self.n_agents)]
+        self.state = self.game.tick(self.state, moves, copy = False, journal = True)
+        game_over = self.game.isEnd(self.state)
+        for i in range(self.n_agents):
+            rewards[i] = self.game.agentLastReward(i) if alive[i] else 0.
+            dones[i] = game_over or not self.state.isAlive(i)
+        return self.observe(obs), rewards, dones, self.state
+
+    def isEnd(self):
+        return self.game.isEnd(self.state)
+
+
+class VecSnakeEnv:
+    """
+    `n_envs` SnakeEnv stepped together. Observations, rewards and dones are written in preallocated
+    buffers, which step returns (they are overwritten by the next step).
+    Finished games are reset right away: `obs` then holds the first observation of the new game and
+    `terminal_obs` the last observation of the finished one.
+    """
+
+    def __init__(self, n_envs, grid_size, n_agents = 1, opponents = [], fruit_ratio = 1, max_iter = None, radius = 16):
+        self.envs = [SnakeEnv(grid_size, n_agents, opponents, fruit_ratio, max_iter, radius) for _ in range(n_envs)]
+        self.n_envs = n_envs
+        self.n_agents = n_agents
+        self.n_features = self.envs[0].n_features
+        self.obs = np.zeros((n_envs, n_agents, self.n_features))
+        self.terminal_obs = np.zeros((n_envs, n_agents, self.n_features))
+        self.rewards = np.zeros((n_envs, n_agents))
+        self.dones = np.zeros((n_envs, n_agents), dtype=bool)
+        self.game_over = np.zeros(n_envs, dtype=bool)
+
+    def reset(self):
+        for k, env in enumerate(self.envs):
+            env.reset(self.obs[k])
+        return self.obs
+
+    def step(self, actions):
+        """
+        `actions` is a (n_envs, n_agents) array of indices in MOVES.
+        Returns the obs, rewards, dones and game_over buffers.
+        """
+        for k, env in enumerate(self.envs):
+            env.step(actions[k], self.obs[k], self.rewards[k], self.dones[k])
+            self.game_over[k] = env.isEnd()
+            if self.game_over[k]:
+                self.terminal_obs[k] = self.obs[k]
+                env.reset(self.obs[k])
+        return self.obs, self.rewards, self.dones, self.game_over
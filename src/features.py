@@ -30,14 +30,25 @@ import utils
 import numpy as np
 from copy import deepcopy
 from scipy.sparse import csr_matrix
-from constants import FRUIT_VAL, FRUIT_BONUS
+from move import toMove
+from areatable import bodyTable, fruitTable, rectSum, rectArea
+from fruitfield import fruitField
+from constants import DIRECTIONS, FRUIT_VAL, FRUIT_BONUS
+
+# tiles of the far field, as (x band, y band) offsets relative to the head (band 0 is within the radius)
+FAR_TILES = [(bx, by) for bx in (-1, 0, 1) for by in (-1, 0, 1) if (bx, by) != (0, 0)]
+FAR_KINDS = ["my-body", "adv-body", "fruit"]
 
 class FeatureExtractor:
-    def __init__(self, id_, grid_size, radius_ = 16):
+    def __init__(self, id_, grid_size, radius_ = 16, far_field = False, fruit_paths = False):
         self.id = id_
         self.grid_size = grid_size
         self.radius = radius_
         self.rotate = True
+        # densities of bodies and fruits beyond the radius (see farField)
+        self.far_field = far_field
+        # path distance from the head to the closest fruit (fruitfield.FruitField), one-hot below the radius
+        self.fruit_paths = fruit_paths
 
         tiles = self.radius**2 + (self.radius - 1)**2
         self.prefix = {
@@ -53,6 +64,11 @@ class FeatureExtractor:
             "non-auth": 5 * tiles + 4 * self.radius,
             "tot" : 1 + 1 + 5 * tiles + 4 * self.radius
         }
+        # optional blocks go between non-auth and trapped, which stays the last feature
+        for name, size in [("far-field", len(FAR_TILES) * len(FAR_KINDS) if far_field else 0),
+                           ("fruit-path", self.radius if fruit_paths else 0)]:
+            self.prefix[name] = self.prefix["tot"] - 1
+            self.prefix["tot"] += size
         self.index = {}
         i = 0
         for x in range(1-self.radius, self.radius):
@@ -60,7 +76,33 @@ class FeatureExtractor:
                 if utils.dist((0,0), (x,y)) < self.radius:
                     self.index[(x,y)] = i
                     i += 1
+        self.buildLookup()
+
+    def buildLookup(self):
+        """
+        For each orientation (None for no rotation), table giving the index of the feature of a cell at
+        offset (x - head_x + radius - 1, y - head_y + radius - 1) from the head, -1 if it is too far.
+        """
+        r = self.radius
+        self.lookup = {}
+        for dir_ in [None] + DIRECTIONS:
+            lut = np.full((2*r - 1, 2*r - 1), -1, dtype=np.int64)
+            for a in range(2*r - 1):
+                for b in range(2*r - 1):
+                    p = (r - 1 - a, r - 1 - b)
+                    if dir_ is not None:
+                        p = utils.rotate(p, dir_)
+                    lut[a, b] = self.index.get(p, -1)
+            self.lookup[dir_] = lut
+        self.padded = {}
 
+    def paddedLookup(self, dir_, pad):
+        """
+        Lookup table of the orientation with `pad` cells of -1 on each side.
+        """
+        if (dir_, pad) not in self.padded:
+            self.padded[(dir_, pad)] = np.pad(self.lookup[dir_], pad, mode = "constant", constant_values = -1)
+        return self.padded[(dir_, pad)]
 
     def nFeatures(self):
         return self.prefix["tot"]
@@ -77,6 +119,7 @@ class FeatureExtractor:
             return utils.add(ref, p, mu = -1)
 
     def dictExtractor(self, state, action):
+        action = toMove(action)
         if action is None:
             return [('trapped', 1.)]
 
@@ -127,52 +170,268 @@ class FeatureExtractor:
         #     (('y', min(head[1], state.grid_size - 1 - head[1])), 1.)
         # ]
 
+        features += [((name, v), 1.) for name, v in self.wallFeatures(head, dir_, state.grid_size)]
+
+        if self.far_field:
+            idx, densities = self.farField(state, self.id, head, dir_)
+            features += [(("far-field", int(i)), float(d)) for i, d in zip(idx, densities) if d != 0]
+        if self.fruit_paths:
+            d = fruitField(state).distance(head)
+            if d < self.radius:
+                features += [(("fruit-path", int(d)), 1.)]
+
+        if not authorized_move:
+            features += [("non-auth", 1.)]
+
+        # revert changes
+        if action.norm() == 1:
+            agent.position.popleft()
+            agent.position.append(last_tail)
+
+        return features
+
+
+    def wallFeatures(self, head, dir_, grid_size):
+        """
+        List of (wall feature, distance) for the walls closer than the radius.
+        """
         wall_features = []
         if dir_ == (0,1):
             wall_features += [
-                (('wall-xl', head[0]), 1.),
-                (('wall-xr', state.grid_size - 1 - head[0]), 1.),
-                (('wall-yt', state.grid_size - 1 - head[1]), 1.),
-                (('wall-yb', head[1]), 1.)
+                ('wall-xl', head[0]),
+                ('wall-xr', grid_size - 1 - head[0]),
+                ('wall-yt', grid_size - 1 - head[1]),
+                ('wall-yb', head[1])
             ]
         elif dir_ == (0,-1):
             wall_features += [
-                (('wall-xr', head[0]), 1.),
-                (('wall-xl', state.grid_size - 1 - head[0]), 1.),
-                (('wall-yb', state.grid_size - 1 - head[1]), 1.),
-                (('wall-yt', head[1]), 1.)
+                ('wall-xr', head[0]),
+                ('wall-xl', grid_size - 1 - head[0]),
+                ('wall-yb', grid_size - 1 - head[1]),
+                ('wall-yt', head[1])
             ]
         elif dir_ == (1,0):
             wall_features += [
-                (('wall-yb', head[0]), 1.),
-                (('wall-yt', state.grid_size - 1 - head[0]), 1.),
-                (('wall-xl', state.grid_size - 1 - head[1]), 1.),
-                (('wall-xr', head[1]), 1.)
+                ('wall-yb', head[0]),
+                ('wall-yt', grid_size - 1 - head[0]),
+                ('wall-xl', grid_size - 1 - head[1]),
+                ('wall-xr', head[1])
             ]
         elif dir_ == (-1,0):
             wall_features += [
-                (('wall-yt', head[0]), 1.),
-                (('wall-yb', state.grid_size - 1 - head[0]), 1.),
-                (('wall-xr', state.grid_size - 1 - head[1]), 1.),
-                (('wall-xl', head[1]), 1.)
+                ('wall-yt', head[0]),
+                ('wall-yb', grid_size - 1 - head[0]),
+                ('wall-xr', grid_size - 1 - head[1]),
+                ('wall-xl', head[1])
             ]
-        features += [(f,v) for f,v in wall_features if abs(f[1]) < self.radius]
+        return [(f,v) for f,v in wall_features if abs(v) < self.radius]
+
+    def farField(self, state, id_, head, dir_):
+        """
+        (offsets in the far-field block, densities) of the bodies of snake id_, of the other snakes
+        and of the fruits in the 8 tiles around the head: the grid is cut along each axis in the cells
+        closer than the radius to the head and those beyond it on either side. Densities come from
+        the summed-area tables of the state (bodies before the pretended move) and tiles are
+        indexed relative to the orientation like the other features.
+        """
+        r, G = self.radius, state.grid_size
+        mine, bodies, fruits = bodyTable(state.occupancy, id_), bodyTable(state.occupancy), fruitTable(state)
+        xbands = [(0, head[0] - r + 1), (head[0] - r + 1, head[0] + r), (head[0] + r, G)]
+        ybands = [(0, head[1] - r + 1), (head[1] - r + 1, head[1] + r), (head[1] + r, G)]
+        n_kinds = len(FAR_KINDS)
+        densities = np.zeros(len(FAR_TILES) * n_kinds)
+        for bx, by in FAR_TILES:
+            x0, x1 = xbands[bx + 1]
+            y0, y1 = ybands[by + 1]
+            area = rectArea(bodies, x0, x1, y0, y1)
+            if area == 0:
+                continue
+            rel = utils.rotate((bx, by), dir_) if self.rotate else (bx, by)
+            k = FAR_TILES.index(rel) * n_kinds
+            own = rectSum(mine, x0, x1, y0, y1)
+            densities[k] = own / area
+            densities[k + 1] = (rectSum(bodies, x0, x1, y0, y1) - own) / area
+            densities[k + 2] = rectSum(fruits, x0, x1, y0, y1) / area
+        return self.prefix["far-field"] + np.arange(len(densities)), densities
+
+    def pretendMove(self, agent, action):
+        """
+        (head, orientation, authorized, not_tail) of the agent after the (pretended) action, where
+        not_tail is the cell of the snake which is not part of its tail after the move.
+        """
+        authorized_move = action.norm() == 0 or agent.authorizedMove(action)
+        if action.norm() == 1:
+            return action.apply(agent.head()), action.direction(), authorized_move, agent.position[-1]
+        elif action.norm() > 1:
+            return action.apply(agent.head()), action.direction(), authorized_move, agent.head()
+        return agent.head(), agent.orientation(), authorized_move, agent.head()
+
+    def scanWindow(self, state, id_, center, margin = 0):
+        """
+        Occupied cells (with their number of segments and whether they belong to snake id_) and
+        fruits (with their value) of the grid closer than radius + margin to center on each axis.
+        """
+        r, G = self.radius, state.grid_size
+        x0, x1 = max(center[0] - r + 1 - margin, 0), min(center[0] + r + margin, G)
+        y0, y1 = max(center[1] - r + 1 - margin, 0), min(center[1] + r + margin, G)
+        x1, y1 = max(x0, x1), max(y0, y1)
+        occupancy = state.occupancy
+        count = occupancy.count[x0:x1, y0:y1]
+        xs, ys = np.nonzero(count)
+        segments = count[xs, ys].astype(np.float64)
+        mine = occupancy.owner[x0:x1, y0:y1][xs, ys] == id_
+        fruits = state.fruit_grid[x0:x1, y0:y1]
+        fxs, fys = np.nonzero(fruits)
+        return xs + x0, ys + y0, segments, mine, fxs + x0, fys + y0, fruits[fxs, fys], margin
+
+    def featureEntries(self, state, id_, head, dir_, authorized_move, not_tail, scan):
+        """
+        Features of snake id_ with the given head as (blocks, extra): blocks are (indices, values)
+        with no repeated index in the indices array (values is an array or a scalar), extra is
+        a list of (index, value) corrections.
+        """
+        r = self.radius
+        xs, ys, segments, mine, fxs, fys, values, margin = scan
+        orientation = dir_ if self.rotate and dir_ in self.lookup else None
+        lut = self.lookup[orientation]
+
+        def index(p):
+            a, b = p[0] - head[0] + r - 1, p[1] - head[1] + r - 1
+            if 0 <= a < 2*r - 1 and 0 <= b < 2*r - 1:
+                return lut[a, b]
+            return -1
+
+        # the head is at most `margin` cells away from the center of the scanned window
+        pad = 2 * margin
+        padded = self.paddedLookup(orientation, pad)
+
+        def indices(xs, ys):
+            return padded[xs - (head[0] - r + 1 - pad), ys - (head[1] - r + 1 - pad)]
+
+        idx = indices(xs, ys)
+        close = idx >= 0
+        fidx = indices(fxs, fys)
+        fruit1 = fidx[(fidx >= 0) & (values == FRUIT_VAL)]
+        fruit2 = fidx[(fidx >= 0) & (values == FRUIT_BONUS)]
+        blocks = [
+            (self.prefix["adv-tail"] + idx[close & ~mine], segments[close & ~mine]),
+            (self.prefix["my-tail"] + idx[close & mine], segments[close & mine]),
+            (self.prefix["fruit1"] + fruit1, 1.),
+            (self.prefix["fruit2"] + fruit2, 1.)
+        ]
+
+        extra = []
+        # cells shared by several snakes right after a collision
+        occupancy = state.occupancy
+        for p, owners in occupancy.shared.items():
+            i = index(p)
+            if i >= 0:
+                mine_count = owners.get(id_, 0)
+                total = sum(owners.values())
+                if occupancy.owner[p] == id_:
+                    extra += [(self.prefix["my-tail"] + i, mine_count - total),
+                              (self.prefix["adv-tail"] + i, total - mine_count)]
+                else:
+                    extra += [(self.prefix["my-tail"] + i, mine_count),
+                              (self.prefix["adv-tail"] + i, -mine_count)]
 
+        # heads are not part of the tails
+        for k, s in state.snakes.items():
+            if k == id_:
+                continue
+            i = index(s.head())
+            if i >= 0:
+                extra += [(self.prefix["adv-head"] + i, 1.), (self.prefix["adv-tail"] + i, -1.)]
+        i = index(not_tail)
+        if i >= 0:
+            extra.append((self.prefix["my-tail"] + i, -1.))
 
+        extra += [(self.prefix[f] + v, 1.) for f, v in self.wallFeatures(head, dir_, state.grid_size)]
+        if self.far_field:
+            blocks.append(self.farField(state, id_, head, dir_))
+        if self.fruit_paths:
+            d = fruitField(state).distance(head)
+            if d < r:
+                extra.append((self.prefix["fruit-path"] + int(d), 1.))
         if not authorized_move:
-            features += [("non-auth", 1.)]
+            extra.append((self.prefix["non-auth"], 1.))
+        return blocks, extra
 
-        # revert changes
-        if action.norm() == 1:
-            agent.position.popleft()
-            agent.position.append(last_tail)
+    def arrayExtractor(self, state, action, out = None):
+        """
+        Same features as dictExtractor, as a dense vector written in `out` if given (no allocation).
+        Body features are read from the occupancy grid of the state around the head and mapped to
+        their index with the lookup table of the orientation, without building the feature list.
+        """
+        if out is None:
+            out = np.zeros(self.prefix["tot"])
+        else:
+            out[:] = 0.
+        if not hasattr(state, "fruit_grid"):
+            return self.featuresToArray(self.dictExtractor(state, action), out)
+        action = toMove(action)
+        if action is None:
+            out[self.prefix["tot"] - 1] += 1.
+            return out
 
-        return features
+        head, dir_, authorized_move, not_tail = self.pretendMove(state.snakes[self.id], action)
+        scan = self.scanWindow(state, self.id, head)
+        blocks, extra = self.featureEntries(state, self.id, head, dir_, authorized_move, not_tail, scan)
+        for idx, values in blocks:
+            out[idx] += values
+        for i, v in extra:
+            out[i] += v
+        return out
 
+    def sparseBatchExtractor(self, state, actions):
+        """
+        CSR matrix of the features of several snakes for their candidate actions, `actions` being a
+        dict {snake id: list of actions or move ids} (None for a trapped snake). There is one row per
+        (id, action), in the order of the dict and of the lists, equal to arrayExtractor for an
+        extractor of that id. The grid around a snake is scanned once for all its actions,
+        which only shift the head.
+        """
+        rows, cols, data = [], [], []
+        n = 0
+        for id_, agent_actions in actions.items():
+            agent_actions = [toMove(a) for a in agent_actions]
+            moves = [a for a in agent_actions if a is not None]
+            if moves:
+                agent = state.snakes[id_]
+                scan = self.scanWindow(state, id_, agent.head(), max(a.norm() for a in moves))
+            for action in agent_actions:
+                if action is None:
+                    rows.append(np.array([n]))
+                    cols.append(np.array([self.prefix["tot"] - 1]))
+                    data.append(np.ones(1))
+                    n += 1
+                    continue
+                head, dir_, authorized_move, not_tail = self.pretendMove(agent, action)
+                blocks, extra = self.featureEntries(state, id_, head, dir_, authorized_move, not_tail, scan)
+                if extra:
+                    idx, values = zip(*extra)
+                    blocks.append((np.array(idx, dtype=np.int64), np.array(values, dtype=np.float64)))
+                for idx, values in blocks:
+                    rows.append(np.full(len(idx), n))
+                    cols.append(idx)
+                    data.append(np.broadcast_to(values, idx.shape))
+                n += 1
+        if n == 0:
+            return csr_matrix((0, self.prefix["tot"]))
+        matrix = csr_matrix((np.concatenate(data), (np.concatenate(rows), np.concatenate(cols))),
+                            shape = (n, self.prefix["tot"]))
+        matrix.eliminate_zeros()
+        return matrix
 
-    def arrayExtractor(self, state, action):
-        features = self.dictExtractor(state, action)
-        arrayFeatures = np.zeros(self.prefix["tot"])
+    def featuresToArray(self, features, out = None):
+        """
+        Dense vector of a list of features from dictExtractor.
+        """
+        if out is None:
+            arrayFeatures = np.zeros(self.prefix["tot"])
+        else:
+            arrayFeatures = out
+            arrayFeatures[:] = 0.
 
         for f,v in features:
             if f == "trapped":
@@ -187,6 +446,10 @@ class FeatureExtractor:
                 arrayFeatures[self.prefix[f[0]] + self.index[f[1]]] += 1.
             elif f[0] in ["wall-xr", "wall-xl", "wall-yt", "wall-yb"]: #["x", "y"]:
                 arrayFeatures[self.prefix[f[0]] + f[1]] += 1.
+            elif f[0] == "far-field":
+                arrayFeatures[f[1]] += v
+            elif f[0] == "fruit-path":
+                arrayFeatures[self.prefix["fruit-path"] + f[1]] += v
             else:
                 print ("ERROR: feature not recognized", f)
         return arrayFeatures
@@ -204,16 +467,22 @@ class FeatureExtractor:
             return self.prefix[f[0]] + self.index[f[1]]
         elif f[0] in ["wall-xr", "wall-xl", "wall-yt", "wall-yb"]: #["x", "y"]:
             return self.prefix[f[0]] + f[1]
+        elif f[0] == "far-field":
+            return f[1]
+        elif f[0] == "fruit-path":
+            return self.prefix["fruit-path"] + f[1]
 
     def sparseExtractor(self, features):
-        return csr_matrix((np.ones(len(features)), [self.keyToIndex(f) for f,v in features], [0, len(features)]), shape = (1, self.prefix["tot"]))
+        return csr_matrix(([v for f,v in features], [self.keyToIndex(f) for f,v in features], [0, len(features)]), shape = (1, self.prefix["tot"]))
 
     def sparseMatrixExtractor(self, feature_list):
         idx = [0]
         count = 0
         cols = []
+        values = []
         for features in feature_list:
             count += len(features)
             idx.append(count)
             cols += [self.keyToIndex(f) for f,v in features]
-        return csr_matrix((np.ones(len(cols)), cols, idx), shape = (len(feature_list), self.prefix["tot"]))
+            values += [v for f,v in features]
+        return csr_matrix((values, cols, idx), shape = (len(feature_list), self.prefix["tot"]))
@@ -0,0 +1,86 @@
+'''
+MIT License
+
+Copyright (c) 2018 Sebastien Dubois, Sebastien Levy, Felix Crevier
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+"""
+Distances to the closest fruit along the free cells, shared by all the agents of a tick
+"""
+
+import weakref
+import numpy as np
+from territory import gridGraph
+
+_cache = weakref.WeakKeyDictionary()    # state => (key, FruitField)
+
+def fruitField(state):
+    """
+    FruitField of `state`, computed once and recomputed only after the bodies or the fruits changed.
+    """
+    key = (state.iter, tuple((id_, s.version) for id_, s in state.snakes.items()),
+           len(state.fruits), state.fruit_index.seq)
+    cached = _cache.get(state)
+    if cached is None or cached[0] != key:
+        cached = (key, FruitField(state))
+        _cache[state] = cached
+    return cached[1]
+
+
+class FruitField:
+    """
+    Multi-source BFS from all the fruits over the free cells of a state: `dist` is the (G, G) array
+    of the length of the shortest path from each free cell to a fruit (0 on fruits, inf on bodies and
+    cells from which no fruit can be reached), computed in C (scipy.sparse.csgraph) in one call.
+    Queries are O(1).
+    """
+
+    def __init__(self, state):
+        self.grid_size = G = state.grid_size
+        free = state.occupancy.count == 0
+        fruits = [pos for pos in state.fruits if free[pos]]
+        self.dist = np.full((G, G), np.inf)
+        self.source = np.full((G, G), -1, dtype=np.int64)
+        if fruits:
+            from scipy.sparse.csgraph import dijkstra
+            sources = np.zeros((G, G), dtype=bool)
+            sources[tuple(np.transpose(fruits))] = True
+            graph = gridGraph(free, sources)
+            dist, _, source = dijkstra(graph, indices=[x * G + y for x, y in fruits], unweighted=True,
+                                       min_only=True, return_predecessors=True)
+            self.dist = dist.reshape(G, G)
+            self.source = source.reshape(G, G)
+
+    def distance(self, pos):
+        """
+        Path length from `pos` to the closest fruit (inf off the grid or if none can be reached).
+        """
+        if 0 <= pos[0] < self.grid_size and 0 <= pos[1] < self.grid_size:
+            return self.dist[pos]
+        return np.inf
+
+    def nearest(self, pos):
+        """
+        Closest fruit of `pos` along the free cells, None if none can be reached.
+        """
+        if not (0 <= pos[0] < self.grid_size and 0 <= pos[1] < self.grid_size) or self.source[pos] < 0:
+            return None
+        return divmod(int(self.source[pos]), self.grid_size)
@@ -0,0 +1,99 @@
+'''
+MIT License
+
+Copyright (c) 2018 Sebastien Dubois, Sebastien Levy, Felix Crevier
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+"""
+Spatial index of the fruits of a state
+"""
+
+import heapq
+
+class FruitIndex:
+    """
+    Fruits bucketed in square blocks of `bucket_size` cells, for nearest fruit queries (Manhattan distance).
+    Each fruit gets a sequence number in insertion order, which breaks ties like iterating over State.fruits.
+    """
+
+    def __init__(self, grid_size, bucket_size = None):
+        if bucket_size is None:
+            bucket_size = max(2, int(round(grid_size ** 0.5)))
+        self.grid_size = grid_size
+        self.bucket_size = bucket_size
+        self.n_buckets = (grid_size + bucket_size - 1) // bucket_size
+        self.buckets = [[{} for _ in range(self.n_buckets)] for _ in range(self.n_buckets)]
+        self.seq = 0
+        self.size = 0
+
+    def _bucket(self, pos):
+        return self.buckets[pos[0] // self.bucket_size][pos[1] // self.bucket_size]
+
+    def add(self, pos):
+        self._bucket(pos)[pos] = self.seq
+        self.seq += 1
+        self.size += 1
+
+    def remove(self, pos):
+        del self._bucket(pos)[pos]
+        self.size -= 1
+
+    def __len__(self):
+        return self.size
+
+    def iterNearest(self, pos):
+        """
+        Yields (distance, seq, fruit) from the closest fruit of `pos` to the farthest.
+        Buckets are visited ring by ring: fruits beyond ring r are at least r * bucket_size + 1 away.
+        """
+        b = self.bucket_size
+        cx, cy = pos[0] // b, pos[1] // b
+        heap = []
+        for r in range(self.n_buckets):
+            for bx in range(max(cx - r, 0), min(cx + r + 1, self.n_buckets)):
+                on_edge = abs(bx - cx) == r
+                for by in range(max(cy - r, 0), min(cy + r + 1, self.n_buckets)):
+                    if on_edge or abs(by - cy) == r:
+                        for f, s in self.buckets[bx][by].items():
+                            heapq.heappush(heap, (abs(f[0] - pos[0]) + abs(f[1] - pos[1]), s, f))
+            while heap and heap[0][0] <= r * b:
+                yield heapq.heappop(heap)
+        while heap:
+            yield heapq.heappop(heap)
+
+    def nearest(self, pos):
+        """
+        (distance, seq, fruit) of the closest fruit of `pos`, None if there are no fruits.
+        """
+        if self.size == 0:
+            return None
+        return next(self.iterNearest(pos))
+
+    def kNearest(self, pos, k):
+        """
+        List of (distance, seq, fruit) of the `k` closest fruits of `pos`.
+        """
+        found = []
+        for item in self.iterNearest(pos):
+            if len(found) == k:
+                break
+            found.append(item)
+        return found
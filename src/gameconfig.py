@@ -0,0 +1,48 @@
+'''
+MIT License
+
+Copyright (c) 2018 Sebastien Dubois, Sebastien Levy, Felix Crevier
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+"""
+Settings of a game, shared by the states of the game and their snakes
+"""
+
+class GameConfig:
+    """
+    Grid size, number of snakes, fruit ratio and iteration limit of a game, and whether its
+    snakes use compact bodies (cellring.CellRing) instead of deques of positions.
+    Each Game (or BatchGame) has its own, so games of different settings can live in the same process.
+    Treat it as read-only: copies of states share it.
+    """
+
+    def __init__(self, grid_size, num_snakes = 2, fruit_ratio = 1, max_iter = None, compact_bodies = False):
+        self.grid_size = grid_size
+        self.num_snakes = num_snakes
+        self.fruit_ratio = fruit_ratio
+        self.max_iter = max_iter
+        self.compact_bodies = compact_bodies
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __str__(self):
+        return " | ".join(["{} = {}".format(k,v) for k,v in list(self.__dict__.items())])
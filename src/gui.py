@@ -27,89 +27,84 @@ Manage GUI
 """
 
 import pygame, interface
-import collections
+from guioptions import Options, snakeTiles, darken
 from pdb import set_trace as t
 
 
-class Options:
-    def __init__(self):
-        # Colors
-        self.colors = {'BLACK' : (0, 0, 0), 'WHITE' : (255,255,255), 'RED' : (255,0,0), 'GREEN':(0,255,0),\
-                       'BLUE':(0,0,255),'BRONZE':(205,127,50), 'GRAY':(180,180,180), 'GOLD':(212,175,55),\
-                       'VIOLET' : (200,0,255)}
-        self.snake_colors = ['RED','GREEN','BLUE','VIOLET','GRAY']
-        self.fruit_colors = ['BRONZE','GOLD']
-        self.headColor = 'WHITE'
-        # Segment geometry
-        self.segment_side = 10
-        self.segment_margin = 2
-        self.total_size = self.segment_side + self.segment_margin
-
-
-class SegmentSprite(pygame.sprite.Sprite):
-    def __init__(self, position,rgb_color, options):
-        # Call the parent's constructor
-        super(SegmentSprite,self).__init__()
-        # Set height, width
-        self.image = pygame.Surface([options.segment_side, options.segment_side])
-        self.image.fill(rgb_color)
-
-        # Make our top-left corner the passed-in location.
-        self.rect = self.image.get_rect()
-        self.rect.x = position[0]
-        self.rect.y = position[1]
-
-
-class SnakeSprite:
-    def __init__(self,positions,color,options):
-        head = positions[0]
-        tail = positions[1:]
-        # Create list of all segment objects
-        segments = [SegmentSprite(head, options.colors[options.headColor], options)]
-        pos_count = collections.defaultdict(int)
-        for pos in tail:
-            pos_count[pos] +=1
-        for pos,n in pos_count.items():
-            tile_color = options.colors[color]
-            if n>1:
-                tile_color = self.darken(tile_color)
-            segments.append(SegmentSprite(pos, tile_color, options))
-        self.segments = segments
-
-    def darken(self,rgb_color):
-        mu = 0.6
-        return tuple([int(c * mu) for c in rgb_color])
-
 class Window:
+    """
+    Incremental renderer: the color of every drawn cell is kept between frames, so that only the
+    cells whose color changed are redrawn (blitting one cached tile surface per color) and sent to
+    the display as dirty rectangles. The first frame is drawn entirely.
+    """
+
     def __init__(self,grid_size,title,options):
         self.options = options
         self.size = 2*[grid_size*options.total_size]
         self.title = title
-        self.all_sprites = pygame.sprite.Group()
         self.display = pygame.display
         self.screen = self.display.set_mode(self.size)
         self.display.set_caption(title)
+        self.tiles = {}             # position => rgb color of the cell on screen
+        self.dirty = []             # positions to redraw at the next refresh
+        self.surfaces = {}          # rgb color => tile surface
+        self.full_redraw = True
+
+    def tileSurface(self, rgb_color):
+        surface = self.surfaces.get(rgb_color)
+        if surface is None:
+            surface = pygame.Surface([self.options.segment_side, self.options.segment_side]).convert()
+            surface.fill(rgb_color)
+            self.surfaces[rgb_color] = surface
+        return surface
 
     def updateSprites(self,state):
-        self.all_sprites = pygame.sprite.Group()
+        """
+        Compute the color of every cell of `state` and the cells which changed since the last frame.
+        """
+        tiles = {}
 
         # Show fruits
         for pos,value in state.fruits.items():
             color = 'GOLD' if value == interface.FRUIT_BONUS else 'BRONZE'
-            self.all_sprites.add(SegmentSprite(self.xy2uv([pos])[0],self.options.colors[color],self.options))
+            tiles[pos] = self.options.colors[color]
 
         # Show Snakes
         for i,snake in state.snakes.items():
             color = self.options.snake_colors[i % len(self.options.snake_colors)]
-            self.all_sprites.add(SnakeSprite(self.xy2uv(snake.position),color,self.options).segments)
+            tiles.update(snakeTiles(snake.position, color, self.options))
+
+        previous = self.tiles
+        self.dirty += [pos for pos,rgb in tiles.items() if previous.get(pos) != rgb]
+        self.dirty += [pos for pos in previous if pos not in tiles]
+        self.tiles = tiles
+
+    def cellRect(self, pos):
+        u, v = self.xy2uv([pos])[0]
+        return pygame.Rect(u, v, self.options.segment_side, self.options.segment_side)
 
     def refresh(self):
-        # -- Draw everything
-        # Clear screen
-        self.screen.fill(self.options.colors['BLACK'])
-        self.all_sprites.draw(self.screen)
-        # Flip screen
-        self.display.flip()
+        if self.full_redraw:
+            # -- Draw everything
+            self.screen.fill(self.options.colors['BLACK'])
+            for pos,rgb in self.tiles.items():
+                self.screen.blit(self.tileSurface(rgb), self.cellRect(pos))
+            self.display.flip()
+            self.full_redraw = False
+        else:
+            # -- Draw the cells which changed, and only update them on the display
+            rects = []
+            for pos in self.dirty:
+                rect = self.cellRect(pos)
+                rgb = self.tiles.get(pos)
+                if rgb is None:
+                    self.screen.fill(self.options.colors['BLACK'], rect)
+                else:
+                    self.screen.blit(self.tileSurface(rgb), rect)
+                rects.append(rect)
+            if rects:
+                self.display.update(rects)
+        self.dirty = []
 
     def print_message(self, message):
         print(message)
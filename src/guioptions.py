@@ -0,0 +1,66 @@
+'''
+MIT License
+
+Copyright (c) 2018 Sebastien Dubois, Sebastien Levy, Felix Crevier
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+"""
+GUI options and cell colors, kept apart from gui so that they can be used without pygame
+"""
+
+import collections
+import itertools
+
+
+class Options:
+    def __init__(self):
+        # Colors
+        self.colors = {'BLACK' : (0, 0, 0), 'WHITE' : (255,255,255), 'RED' : (255,0,0), 'GREEN':(0,255,0),\
+                       'BLUE':(0,0,255),'BRONZE':(205,127,50), 'GRAY':(180,180,180), 'GOLD':(212,175,55),\
+                       'VIOLET' : (200,0,255)}
+        self.snake_colors = ['RED','GREEN','BLUE','VIOLET','GRAY']
+        self.fruit_colors = ['BRONZE','GOLD']
+        self.headColor = 'WHITE'
+        # Segment geometry
+        self.segment_side = 10
+        self.segment_margin = 2
+        self.total_size = self.segment_side + self.segment_margin
+
+
+def snakeTiles(positions, color, options):
+    """
+    {position => rgb color} of the cells of a snake: white head, then its body, darker on the cells
+    where it overlaps itself (drawn over the head).
+    """
+    tiles = {positions[0] : options.colors[options.headColor]}
+    pos_count = collections.defaultdict(int)
+    for pos in itertools.islice(positions, 1, None):
+        pos_count[pos] +=1
+    for pos,n in pos_count.items():
+        tile_color = options.colors[color]
+        if n>1:
+            tile_color = darken(tile_color)
+        tiles[pos] = tile_color
+    return tiles
+
+def darken(rgb_color):
+    mu = 0.6
+    return tuple([int(c * mu) for c in rgb_color])
@@ -0,0 +1,55 @@
+'''
+MIT License
+
+Copyright (c) 2018 Sebastien Dubois, Sebastien Levy, Felix Crevier
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+"""
+Game loop without any GUI, which never imports pygame
+"""
+
+from GameInterface import Game
+
+def runHeadless(strategies, grid_size, fruit_ratio = 1., max_iter = None, replay = None, profiler = None):
+    """
+    Play a game between `strategies` until it ends, recording it with `replay` (a
+    replay.ReplayWriter, closed at the end) if given and timing its phases with `profiler`
+    (an instrument.Profiler) if given.
+    Returns the final state and per-step stats: the number of snakes alive and the points of each snake.
+    """
+    game = Game(grid_size, len(strategies), fruit_ratio = fruit_ratio, max_iter = max_iter)
+    game.profiler = profiler
+    state = game.start(strategies)
+    stats = {"alive" : [], "points" : []}
+    if replay is not None:
+        replay.start(game, state)
+
+    while not game.isEnd(state):
+        actions = game.agentActions()
+        state = game.tick(state, actions, copy = False)
+        if replay is not None:
+            replay.record(game, actions, state)
+        stats["alive"].append(len(state.snakes))
+        stats["points"].append({id : s.points for id, s in state.snakes.items()})
+
+    if replay is not None:
+        replay.close()
+    return state, stats
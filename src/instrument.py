@@ -0,0 +1,187 @@
+'''
+MIT License
+
+Copyright (c) 2018 Sebastien Dubois, Sebastien Levy, Felix Crevier
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+"""
+Opt-in timers, counters and histograms of the phases of a tick
+"""
+
+import json
+import math
+from time import perf_counter
+
+clock = perf_counter
+
+class PhaseStats:
+    """
+    Number of calls, total/min/max duration (seconds) of a phase and the histogram of its durations
+    in buckets of powers of 2 microseconds: bucket b counts durations in [2^(b-1), 2^b) us
+    (bucket 0 for durations under 1 us).
+    """
+
+    N_BUCKETS = 32
+    __slots__ = ("count", "total", "min", "max", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.
+        self.min = math.inf
+        self.max = 0.
+        self.buckets = [0] * self.N_BUCKETS
+
+    def add(self, duration):
+        self.count += 1
+        self.total += duration
+        if duration < self.min:
+            self.min = duration
+        if duration > self.max:
+            self.max = duration
+        b = math.frexp(duration * 1e6)[1] if duration >= 1e-6 else 0
+        self.buckets[min(b, self.N_BUCKETS - 1)] += 1
+
+    def merge(self, other):
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.buckets = [a + b for a, b in zip(self.buckets, other.buckets)]
+
+    def percentile(self, q):
+        """
+        Upper bound (seconds) of the bucket holding the q-th percentile.
+        """
+        if self.count == 0:
+            return 0.
+        rank, seen = q / 100. * self.count, 0
+        for b, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank:
+                return min(2. ** b * 1e-6, self.max)
+        return self.max
+
+    def toDict(self):
+        return {"count": self.count, "total": self.total, "mean": self.total / self.count if self.count else 0.,
+                "min": self.min if self.count else 0., "max": self.max,
+                "p50": self.percentile(50), "p99": self.percentile(99), "buckets": self.buckets}
+
+    @classmethod
+    def fromDict(cls, d):
+        stats = cls()
+        stats.count, stats.total, stats.max = d["count"], d["total"], d["max"]
+        stats.min = d["min"] if d["count"] else math.inf
+        stats.buckets = list(d["buckets"])
+        return stats
+
+
+class Profiler:
+    """
+    Durations of named phases and counters. Games record into it when it is their `profiler`
+    (Game.profiler, None by default, so that instrumented code only checks for None when disabled):
+        "agent <id> (<name>)"   decision of each agent in Game.agentActions
+        "copy"                  deepcopy of the state in Game.tick
+        "update"                moves of the snakes in State.update
+        "collisions"            deaths (collisions, off-grid heads) and their fruits in State.update
+        "fruit spawn"           random fruit of Game.tick
+        "tick"                  whole Game.tick (without the agents' decisions)
+        "render"                GUI update in controller
+    and counts "ticks", "deaths" and "fruits spawned".
+    """
+
+    def __init__(self):
+        self.phases = {}
+        self.counters = {}
+
+    def record(self, phase, duration):
+        stats = self.phases.get(phase)
+        if stats is None:
+            stats = self.phases[phase] = PhaseStats()
+        stats.add(duration)
+
+    def count(self, counter, n = 1):
+        self.counters[counter] = self.counters.get(counter, 0) + n
+
+    def timer(self, phase):
+        """
+        Context manager recording the duration of its block as `phase`, for code which is not hot.
+        """
+        return _Timer(self, phase)
+
+    def merge(self, other):
+        """
+        Add the records of `other` (a Profiler or its summary()).
+        """
+        if isinstance(other, dict):
+            other = Profiler.fromSummary(other)
+        for phase, stats in other.phases.items():
+            if phase in self.phases:
+                self.phases[phase].merge(stats)
+            else:
+                self.phases[phase] = PhaseStats()
+                self.phases[phase].merge(stats)
+        for counter, n in other.counters.items():
+            self.count(counter, n)
+        return self
+
+    def summary(self):
+        return {"phases": dict((p, s.toDict()) for p, s in self.phases.items()), "counters": dict(self.counters)}
+
+    @classmethod
+    def fromSummary(cls, summary):
+        profiler = cls()
+        profiler.phases = dict((p, PhaseStats.fromDict(d)) for p, d in summary["phases"].items())
+        profiler.counters = dict(summary["counters"])
+        return profiler
+
+    def dump(self, path):
+        with open(path, "w") as fout:
+            json.dump(self.summary(), fout, indent = 2)
+
+    def report(self):
+        """
+        Table of the phases, by decreasing total time, and the counters.
+        """
+        lines = ["{:<36} {:>9} {:>10} {:>10} {:>10} {:>10}".format("phase", "calls", "total s", "mean us", "p99 us", "max us")]
+        for phase, s in sorted(self.phases.items(), key = lambda item: -item[1].total):
+            lines.append("{:<36} {:>9} {:>10.3f} {:>10.1f} {:>10.1f} {:>10.1f}".format(
+                phase, s.count, s.total, 1e6 * s.total / s.count, 1e6 * s.percentile(99), 1e6 * s.max))
+        for counter, n in sorted(self.counters.items()):
+            lines.append("{:<36} {:>9}".format(counter, n))
+        return "\n".join(lines)
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+class _Timer:
+    __slots__ = ("profiler", "phase", "start")
+
+    def __init__(self, profiler, phase):
+        self.profiler = profiler
+        self.phase = phase
+
+    def __enter__(self):
+        self.start = clock()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.phase, clock() - self.start)
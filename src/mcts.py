@@ -0,0 +1,242 @@
+'''
+MIT License
+
+Copyright (c) 2018 Sebastien Dubois, Sebastien Levy, Felix Crevier
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+"""
+Monte Carlo Tree Search strategy with batched rollouts
+"""
+
+import math
+import time
+import utils
+import numpy as np
+from copy import deepcopy
+
+class MCTSNode:
+    """
+    Node of the tree: the snakes alive, their legal moves and, for each snake, the visit count and
+    total value of each of its moves. Children are indexed by the joint move (tuple of indices in
+    the moves of the snakes, in the order of `ids`).
+    """
+
+    __slots__ = ("ids", "moves", "visits", "counts", "values", "children", "search")
+
+    def __init__(self, state, search = 0):
+        self.ids = list(state.snakes.keys())
+        self.moves = {i : state.actions(i) or [None] for i in self.ids}
+        self.visits = 0
+        self.counts = {i : [0] * len(self.moves[i]) for i in self.ids}
+        self.values = {i : [0.] * len(self.moves[i]) for i in self.ids}
+        self.children = {}
+        # search in which the node was created or last checked against the state
+        self.search = search
+
+    def matches(self, state):
+        """
+        Whether the node still describes `state` (the real game can differ from the tree by its random
+        fruits, which make snakes grow).
+        """
+        return self.ids == list(state.snakes.keys()) and \
+            all((state.actions(i) or [None]) == self.moves[i] for i in self.ids)
+
+    def isTerminal(self, root_id):
+        return len(self.ids) <= 1 or root_id not in self.ids
+
+
+class MCTSStrategy:
+    """
+    Decoupled UCT for the simultaneous moves of the game: at each node every snake picks its own
+    move with UCB1 on its own statistics, and the joint move leads to the child, the state being
+    updated with State.journaledUpdate (without the random fruit of Game.tick) and rolled back.
+    Leaves are evaluated by rollouts of `horizon` ticks in a BatchGame, `batch_size` leaves at a
+    time (a virtual loss spreads the leaves of a batch over the tree), with the vectorized
+    greedyStrategy or randomStrategy (`rollout` = "greedy" or "random").
+    A rollout is worth 1 to the winner, 0.5 + 0.4 tanh(points won / POINTS_SCALE) to a snake alive
+    at the horizon, and (S - rank) / (S - 1) to a snake which died with rank `rank`, S being the
+    number of snakes alive at the root.
+    The search stops after `n_rollouts` rollouts or before the batch which would exceed
+    `time_budget` seconds (whichever is set and comes first), and the most visited move is
+    played. The subtree of the joint move actually played is kept for the next tick. Acceleration moves are not supported by the rollouts.
+    """
+
+    POINTS_SCALE = 3.
+
+    def __init__(self, time_budget = 0.1, n_rollouts = None, batch_size = 32, horizon = 10,
+                 rollout = "random", exploration = 0.7, seed = None):
+        assert rollout in ("greedy", "random"), "unknown rollout policy {}".format(rollout)
+        assert time_budget is not None or n_rollouts is not None, "MCTS needs a time or a rollout budget"
+        self.time_budget = time_budget
+        self.n_rollouts = n_rollouts
+        self.batch_size = batch_size
+        self.horizon = horizon
+        self.rollout = rollout
+        self.exploration = exploration
+        self.seed = seed
+        self.batch = None
+        self.search = 0
+        # id => (root node, heads of the snakes of the root, iteration of the root)
+        self.trees = {}
+        # rollouts of the last search
+        self.last_rollouts = 0
+
+    def __call__(self, id, state):
+        actions = state.actions(id)
+        if len(actions) == 0:
+            return None
+        if len(actions) == 1:
+            return actions[0]
+        deadline = None if self.time_budget is None else time.time() + self.time_budget
+        self.search += 1
+        root = self.reuseTree(id, state)
+        work = deepcopy(state)
+        batch = self.getBatch(state)
+
+        self.root_points = np.zeros(state.num_snakes)
+        for i, s in state.snakes.items():
+            self.root_points[i] = s.points
+        self.last_rollouts = 0
+        duration = 0.
+        while self.n_rollouts is None or self.last_rollouts < self.n_rollouts:
+            # stop when the next batch would end after the deadline
+            start = time.time()
+            if deadline is not None and self.last_rollouts > 0 and start + duration > deadline:
+                break
+            size = self.batch_size
+            if self.n_rollouts is not None:
+                size = min(size, self.n_rollouts - self.last_rollouts)
+            self.runBatch(root, work, id, batch, size)
+            self.last_rollouts += size
+            duration = time.time() - start
+
+        counts = root.counts[id]
+        best = max(range(len(counts)), key = lambda k : counts[k])
+        self.trees[id] = (root, {i : s.head() for i, s in state.snakes.items()}, state.iter)
+        return root.moves[id][best]
+
+    def getBatch(self, state):
+        # imported here since batch depends on constants, which builds an MCTSAgent
+        from batch import BatchGame
+        if self.batch is None or self.batch.grid_size != state.grid_size or self.batch.n_snakes != state.num_snakes:
+            self.batch = BatchGame(self.batch_size, state.grid_size, state.num_snakes, seed = self.seed)
+        return self.batch
+
+    def reuseTree(self, id, state):
+        """
+        Child of the previous root for the joint move which led to `state`, a new root if unknown.
+        """
+        if id in self.trees:
+            node, heads, iteration = self.trees[id]
+            if state.iter == iteration + 1 and all(i in state.snakes for i in node.ids):
+                index = []
+                for i in node.ids:
+                    direction = utils.add(state.snakes[i].head(), heads[i], mu = -1)
+                    k = [m.direction() if m is not None else None for m in node.moves[i]]
+                    if direction not in k:
+                        break
+                    index.append(k.index(direction))
+                child = node.children.get(tuple(index))
+                if child is not None and child.matches(state):
+                    child.search = self.search
+                    return child
+        return MCTSNode(state, self.search)
+
+    def select(self, node, i):
+        """
+        UCB1 choice of snake i among its moves at `node` (untried moves first).
+        """
+        counts, values = node.counts[i], node.values[i]
+        log_visits = math.log(node.visits + 1)
+        best, best_k = None, 0
+        for k, c in enumerate(counts):
+            if c == 0:
+                return k
+            u = values[k] / c + self.exploration * math.sqrt(log_visits / c)
+            if best is None or u > best:
+                best, best_k = u, k
+        return best_k
+
+    def descend(self, root, state, id):
+        """
+        Walk down the tree from `root`, updating `state` and adding a virtual visit to the moves taken,
+        until a new node is created or a terminal node is reached. Nodes of a reused subtree which
+        don't match the state anymore are replaced by new ones.
+        Returns the path [(node, joint move index)] and the changes to roll `state` back.
+        """
+        path, changes = [], []
+        node = root
+        while not node.isTerminal(id):
+            index = tuple(self.select(node, i) for i in node.ids)
+            node.visits += 1
+            for i, k in zip(node.ids, index):
+                node.counts[i][k] += 1
+            path.append((node, index))
+            changes.append(state.journaledUpdate({i : node.moves[i][k] for i, k in zip(node.ids, index)}))
+            child = node.children.get(index)
+            if child is not None and child.search != self.search:
+                if not child.matches(state):
+                    child = None
+                else:
+                    child.search = self.search
+            if child is None:
+                node.children[index] = MCTSNode(state, self.search)
+                break
+            node = child
+        return path, changes
+
+    def runBatch(self, root, state, id, batch, size):
+        """
+        Select `size` leaves, roll them out together in `batch` and back up the values.
+        """
+        paths = []
+        for n in range(size):
+            path, changes = self.descend(root, state, id)
+            batch.load(n, state)
+            for c in reversed(changes):
+                state.reverseChanges(c)
+            paths.append(path)
+        batch.done[size:] = True
+        batch.alive[size:] = False
+
+        policy = batch.greedyMoves if self.rollout == "greedy" else batch.randomMoves
+        for _ in range(self.horizon):
+            if batch.done.all():
+                break
+            batch.step(policy())
+
+        values = self.rolloutValues(batch, len(root.ids))
+        for n, path in enumerate(paths):
+            for node, index in path:
+                for i, k in zip(node.ids, index):
+                    node.values[i][k] += values[n, i]
+
+    def rolloutValues(self, batch, n_root):
+        """
+        (n_games, n_snakes) values of the rollouts for every snake.
+        """
+        alive = batch.alive
+        n_alive = alive.sum(axis=1, keepdims=True)
+        gain = (batch.points - self.root_points[None, :]) / self.POINTS_SCALE
+        survivor = np.where(n_alive == 1, 1., 0.5 + 0.4 * np.tanh(gain))
+        dead = np.clip((n_root - batch.rank) / max(n_root - 1., 1.), 0., 1.)
+        dead = np.where(batch.rank == 1, 1., dead)
+        return np.where(alive, survivor, dead)
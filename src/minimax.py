@@ -0,0 +1,179 @@
+'''
+MIT License
+
+Copyright (c) 2018 Sebastien Dubois, Sebastien Levy, Felix Crevier
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+"""
+Minimax / expectimax search strategies
+"""
+
+import time
+from copy import deepcopy
+from zobrist import TranspositionTable
+
+def survivorDfunc(state, agent, depth, ratio):
+    """
+    Search depth (in rounds, every snake moving once) for `agent`: `depth` against one opponent,
+    multiplied by `ratio` for every other survivor, and at least 1.
+    """
+    return max(1, int(depth * ratio ** max(len(state.snakes) - 2, 0)))
+
+class SearchTimeout(Exception):
+    pass
+
+class MinimaxStrategy:
+    """
+    Strategy searching the game tree with the snakes moving one after the other
+    (State.generateSuccessor / reverseChanges on a copy of the state), from the point of view of
+    the snake `id` it plays for.
+    - mode "paranoid": every other snake minimizes the score of `id` (alpha-beta, i.e. plain
+      minimax with two snakes),
+    - mode "expectimax": every other snake plays its legal moves uniformly at random.
+    The depth (in rounds, an int or a function (state, id) => int such as survivorDfunc) is
+    reached by iterative deepening, and the search returns the move of the last finished
+    iteration once `time_budget` seconds have elapsed.
+    Leaves are scored with State.getScore, minus the distance to the closest fruit as a tie-breaker.
+    """
+
+    CHECK_EVERY = 64    # nodes between two checks of the clock
+
+    def __init__(self, depth = 2, time_budget = 0.1, mode = "paranoid", tt_size = 2**16):
+        assert mode in ("paranoid", "expectimax"), "unknown search mode {}".format(mode)
+        self.depth = depth
+        self.time_budget = time_budget
+        self.mode = mode
+        self.tt_size = tt_size
+        self.tables = {}
+        # depth reached and number of nodes of the last search
+        self.last_depth = 0
+        self.nodes = 0
+
+    def maxDepth(self, state, id):
+        return self.depth(state, id) if callable(self.depth) else self.depth
+
+    def __call__(self, id, state):
+        actions = state.actions(id)
+        if len(actions) == 0:
+            return None
+        if len(actions) == 1:
+            return actions[0]
+        deadline = time.time() + self.time_budget
+        state = deepcopy(state)
+        state.enableHashing()
+        if id not in self.tables:
+            self.tables[id] = TranspositionTable(self.tt_size)
+        table = self.tables[id]
+        table.newSearch()
+
+        self.deadline = deadline
+        self.nodes = 0
+        self.last_depth = 0
+        best = self.orderMoves(state, id, actions)[0]
+        for depth in range(1, self.maxDepth(state, id) + 1):
+            self.root_plies = depth * len(state.snakes)
+            try:
+                _, move = self.search(state, id, id, self.root_plies, -float("inf"), float("inf"), table)
+            except SearchTimeout:
+                break
+            if move is not None:
+                best = move
+            self.last_depth = depth
+        return best
+
+    def evaluate(self, state, id):
+        score = state.getScore(id)
+        if id in state.snakes and len(state.snakes) > 1 and len(state.fruits) > 0:
+            d = state.nearestFruit(state.snakes[id].head())[0]
+            score -= d / (2. * state.grid_size)
+        return score
+
+    def isTerminal(self, state, id):
+        return id not in state.snakes or len(state.snakes) <= 1 or state.timesUp()
+
+    def orderMoves(self, state, agent, actions, first = None):
+        """
+        `actions` with `first` (e.g. the best move of a previous search) first, then the moves which
+        don't run into another snake, closest to a fruit first.
+        """
+        snake = state.snakes[agent]
+        def key(m):
+            head = m.apply(snake.head())
+            fruit = state.nearestFruit(head) if len(state.fruits) > 0 else None
+            return (m is not first, state.onOtherSnakes(head, agent), fruit[0] if fruit else 0)
+        return sorted(actions, key = key)
+
+    def search(self, state, root, agent, plies, alpha, beta, table):
+        """
+        (value for `root`, best move of `agent`) of `state` with `agent` to move, searched `plies` moves deep.
+        """
+        self.nodes += 1
+        if self.nodes % self.CHECK_EVERY == 0 and time.time() > self.deadline:
+            raise SearchTimeout()
+        if plies == 0 or self.isTerminal(state, root):
+            return self.evaluate(state, root), None
+
+        h = state.zobristHash(agent)
+        value = table.probe(h, plies, alpha, beta)
+        if value is not None and plies != self.root_plies:
+            return value, None
+        actions = state.actions(agent)
+        if len(actions) == 0:
+            actions = [None]
+        else:
+            actions = self.orderMoves(state, agent, actions, table.bestMove(h))
+        next_agent = state.getNextAgent(agent)
+
+        if agent != root and self.mode == "expectimax":
+            total = 0.
+            for move in actions:
+                changes = state.generateSuccessor(agent, move)
+                value, _ = self.search(state, root, next_agent, plies - 1, -float("inf"), float("inf"), table)
+                state.reverseChanges(changes)
+                total += value
+            value = total / len(actions)
+            table.store(h, plies, value, TranspositionTable.EXACT)
+            return value, None
+
+        maximize = (agent == root)
+        alpha0, beta0 = alpha, beta
+        best_value, best_move = None, None
+        for move in actions:
+            changes = state.generateSuccessor(agent, move)
+            value, _ = self.search(state, root, next_agent, plies - 1, alpha, beta, table)
+            state.reverseChanges(changes)
+            if best_value is None or (value > best_value if maximize else value < best_value):
+                best_value, best_move = value, move
+            if maximize:
+                alpha = max(alpha, value)
+            else:
+                beta = min(beta, value)
+            if alpha >= beta:
+                break
+
+        if best_value <= alpha0:
+            flag = TranspositionTable.UPPER
+        elif best_value >= beta0:
+            flag = TranspositionTable.LOWER
+        else:
+            flag = TranspositionTable.EXACT
+        table.store(h, plies, best_value, flag, best_move)
+        return best_value, best_move
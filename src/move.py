@@ -22,16 +22,38 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 '''
 
-import utils
-
 class Move:
     """
-    Move object including norm and direction
+    Move object including norm and direction.
+    Moves are interned: Move(direction, norm) always returns the same object for the same
+    direction and norm, with an integer id (ids of MOVES are their indices in MOVES)
+    and precomputed delta (direction * norm) and reverse direction.
     """
 
+    __slots__ = ("dir", "n", "id", "delta", "reverse")
+    _table = {}     # (direction, norm) => Move
+    _by_id = []
+
+    def __new__(cls, direction, norm=1):
+        key = (tuple(direction), norm)
+        move = cls._table.get(key)
+        if move is None:
+            move = object.__new__(cls)
+            move.dir = key[0]
+            move.n = norm
+            move.id = len(cls._by_id)
+            move.delta = (move.dir[0] * norm, move.dir[1] * norm)
+            move.reverse = (-move.dir[0], -move.dir[1])
+            cls._table[key] = move
+            cls._by_id.append(move)
+        return move
+
     def __init__(self, direction, norm=1):
-        self.dir = direction
-        self.n = norm
+        pass
+
+    @classmethod
+    def byId(cls, id_):
+        return cls._by_id[id_]
 
     def norm(self):
         return self.n
@@ -40,11 +62,39 @@ class Move:
         return self.dir
 
     def apply(self, point):
-        return utils.add(point, self.direction(), mu=self.norm())
+        return (point[0] + self.delta[0], point[1] + self.delta[1])
 
     def applyDirection(self, point, mu=1):
-        return utils.add(point, self.direction(), mu=mu)
+        return (point[0] + mu * self.dir[0], point[1] + mu * self.dir[1])
+
+    def __reduce__(self):
+        return (Move, (self.dir, self.n))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
 
     def __repr__(self):
         return str(self.dir)
         #return "({}, {})".format(self.dir, self.norm)
+
+# global variables, re-exported by constants. MOVES and NO_MOVE are registered here, as soon as
+# Move exists, so that they are always the first moves created: MOVES[i].id == i
+ACCELERATION = False
+DIRECTIONS = [(1,0), (0,1), (-1,0), (0,-1)]      # authorized moves
+NORM_MOVES = [1]
+if ACCELERATION:
+    NORM_MOVES.append(2)                    # acceleration moves
+MOVES = [Move(dir, norm) for dir in DIRECTIONS for norm in NORM_MOVES]
+NO_MOVE = Move(direction = (0,0), norm = 0)
+
+def toMove(m):
+    """
+    The Move of `m`, which is a Move, a move id or None (no move). Negative ids also mean no move.
+    """
+    if m is None or m.__class__ is Move:
+        return m
+    id_ = int(m)
+    return Move.byId(id_) if id_ >= 0 else None
@@ -0,0 +1,99 @@
+'''
+MIT License
+
+Copyright (c) 2018 Sebastien Dubois, Sebastien Levy, Felix Crevier
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+"""
+Occupancy grid shared by the snakes of a state
+"""
+
+import numpy as np
+
+class Occupancy:
+    """
+    Number of body segments on each cell (`count`) and id of the snake they belong to (`owner`, -1 if empty).
+    Segments of different snakes only share a cell between a collision and the removal of the dead snake;
+    such cells are tracked in `shared` as {position => {id => count}}.
+    When Zobrist `keys` are set, `hash` is kept up to date with the segments (and the fruits of the state).
+    `version` is bumped by every change, so that tables derived from the grid know when they are stale.
+    """
+
+    def __init__(self, grid_size):
+        self.grid_size = grid_size
+        self.count = np.zeros((grid_size, grid_size), dtype=np.uint8)
+        self.owner = np.full((grid_size, grid_size), -1, dtype=np.int8)
+        self.shared = {}
+        self.keys = None
+        self.hash = 0
+        self.version = 0
+
+    def add(self, pos, id):
+        if self.keys is not None:
+            self.hash ^= self.keys.segment(id, pos, self.countOf(pos, id))
+        c = self.count[pos]
+        if c == 0:
+            self.owner[pos] = id
+        elif pos in self.shared:
+            self.shared[pos][id] = self.shared[pos].get(id, 0) + 1
+        elif self.owner[pos] != id:
+            self.shared[pos] = {int(self.owner[pos]) : int(c), id : 1}
+        self.count[pos] = c + 1
+        self.version += 1
+
+    def remove(self, pos, id):
+        if self.keys is not None:
+            self.hash ^= self.keys.segment(id, pos, self.countOf(pos, id) - 1)
+        c = self.count[pos] - 1
+        self.count[pos] = c
+        if pos in self.shared:
+            owners = self.shared[pos]
+            owners[id] -= 1
+            if owners[id] == 0:
+                del owners[id]
+            if len(owners) == 1:
+                self.owner[pos] = next(iter(owners))
+                del self.shared[pos]
+        elif c == 0:
+            self.owner[pos] = -1
+        self.version += 1
+
+    def total(self, pos):
+        """
+        Number of segments of any snake at `pos`.
+        """
+        return self.count[pos]
+
+    def countOf(self, pos, id):
+        """
+        Number of segments of snake `id` at `pos`.
+        """
+        if pos in self.shared:
+            return self.shared[pos].get(id, 0)
+        if self.owner[pos] == id:
+            return self.count[pos]
+        return 0
+
+    def countOthers(self, pos, id):
+        """
+        Number of segments of snakes other than `id` at `pos`.
+        """
+        return self.count[pos] - self.countOf(pos, id)
@@ -0,0 +1,373 @@
+'''
+MIT License
+
+Copyright (c) 2018 Sebastien Dubois, Sebastien Levy, Felix Crevier
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+"""
+Headless rendering of states to RGB frames with NumPy, and export of the frames to GIF or video
+"""
+
+import os
+import glob
+import shutil
+import argparse
+import subprocess
+import numpy as np
+import guioptions
+from constants import FRUIT_BONUS
+from replay import ReplayReader
+
+# palette indices of the cells
+BACKGROUND, HEAD, BRONZE, GOLD, SNAKES = range(5)
+
+class Rasterizer:
+    """
+    Paints states into frames with the colors and geometry of guioptions.Options, pixel for pixel as
+    gui.Window draws them. Cells are first painted into (grid_size, grid_size) grids of palette
+    indices (x-major, like occupancy.Occupancy), which are scaled up to (height, width) frames of
+    indices with a single gather. Snake i uses the palette entries SNAKES + 2 * (i % n_colors)
+    and the next one for the cells where it overlaps itself.
+    """
+
+    def __init__(self, grid_size, options = None):
+        self.grid_size = grid_size
+        self.options = options if options is not None else guioptions.Options()
+        colors = self.options.colors
+        palette = [colors['BLACK'], colors[self.options.headColor], colors['BRONZE'], colors['GOLD']]
+        for name in self.options.snake_colors:
+            palette += [colors[name], guioptions.darken(colors[name])]
+        self.palette = np.array(palette, dtype=np.uint8)
+        self.n_colors = len(self.options.snake_colors)
+
+        # pixel => cell along each axis, grid_size for the margins (background cells of the padded grid)
+        pixels = np.arange(grid_size * self.options.total_size)
+        cell, offset = np.divmod(pixels, self.options.total_size)
+        self.pixel_cells = np.where(offset < self.options.segment_side, cell, grid_size)
+        self.size = len(pixels)
+
+    def emptyCells(self, n = None):
+        G = self.grid_size + 1
+        return np.zeros((G, G) if n is None else (n, G, G), dtype=np.uint8)
+
+    def cells(self, state, out = None):
+        """
+        (grid_size + 1, grid_size + 1) palette indices of the cells of `state`, the last row and
+        column being the background of the margins. Snakes are painted in id order over the
+        fruits, the body of a snake over its head.
+        """
+        G = self.grid_size
+        grid = self.emptyCells() if out is None else out
+        grid[:] = BACKGROUND
+        if state.fruits:
+            pos = np.array(list(state.fruits.keys()), dtype=np.int64)
+            values = np.array(list(state.fruits.values()))
+            grid[pos[:, 0], pos[:, 1]] = np.where(values == FRUIT_BONUS, GOLD, BRONZE)
+        for i, snake in state.snakes.items():
+            pos = np.array(list(snake.position), dtype=np.int64)
+            pos = pos[((pos >= 0) & (pos < G)).all(axis=1)]
+            if len(pos) == 0:
+                continue
+            grid[pos[0, 0], pos[0, 1]] = HEAD
+            body, counts = np.unique(pos[1:, 0] * G + pos[1:, 1], return_counts=True)
+            grid[body // G, body % G] = SNAKES + 2 * (i % self.n_colors) + (counts > 1)
+        return grid
+
+    def batchCells(self, batch, games = None):
+        """
+        Palette indices of the cells of the games of a batch.BatchGame (all of them by default),
+        painted as `cells` does except that a cell shared by two snakes takes the color of its
+        owner in the batch.
+        """
+        G = self.grid_size
+        games = np.arange(batch.n_games) if games is None else np.asarray(games)
+        grids = self.emptyCells(len(games))
+        grid = grids[:, :G, :G]
+        fruits, count, owner = batch.fruits[games], batch.count[games], batch.owner[games]
+        grid[fruits > 0] = BRONZE
+        grid[fruits == FRUIT_BONUS] = GOLD
+
+        # a head is white unless another segment of its snake lies on it
+        heads = np.zeros(count.shape, dtype=np.int64)
+        g, i = np.nonzero(batch.alive[games])
+        head = batch.body[games[g], i, batch.head_ptr[games[g], i]]
+        heads[g, head // G, head % G] = 1
+        body = count - heads
+        colors = SNAKES + 2 * (owner.astype(np.int64) % self.n_colors) + (body > 1)
+        grid[body > 0] = colors[body > 0]
+        grid[(heads > 0) & (body == 0)] = HEAD
+        return grids
+
+    def indices(self, cells):
+        """
+        (..., height, width) palette indices of the pixels of grids of cells.
+        """
+        p = self.pixel_cells
+        return cells[..., p[None, :], p[:, None]]
+
+    def rgb(self, indices):
+        return self.palette[indices]
+
+    def frame(self, state):
+        """
+        (height, width, 3) uint8 RGB image of `state`.
+        """
+        return self.rgb(self.indices(self.cells(state)))
+
+    def frames(self, states):
+        """
+        (n, height, width, 3) uint8 RGB images of a sequence of states.
+        """
+        states = list(states)
+        grids = self.emptyCells(len(states))
+        for n, state in enumerate(states):
+            self.cells(state, grids[n])
+        return self.rgb(self.indices(grids))
+
+
+def lzwEncode(pixels, min_code_size):
+    """
+    GIF variable length LZW compression of a sequence of palette indices.
+    """
+    clear, end = 1 << min_code_size, (1 << min_code_size) + 1
+    out = bytearray()
+    bits = n_bits = 0
+    size = min_code_size + 1
+    table, next_code = {}, end + 1
+
+    def emit(code, size):
+        nonlocal bits, n_bits
+        bits |= code << n_bits
+        n_bits += size
+        while n_bits >= 8:
+            out.append(bits & 0xFF)
+            bits >>= 8
+            n_bits -= 8
+
+    emit(clear, size)
+    pixels = iter(pixels)
+    prefix = next(pixels)
+    for p in pixels:
+        key = (prefix << 8) | p
+        code = table.get(key)
+        if code is not None:
+            prefix = code
+            continue
+        emit(prefix, size)
+        # the decoder adds its entries one code late, hence the check before adding ours
+        if next_code == 1 << size and size < 12:
+            size += 1
+        if next_code < 4096:
+            table[key] = next_code
+            next_code += 1
+        else:
+            emit(clear, size)
+            table, next_code, size = {}, end + 1, min_code_size + 1
+        prefix = p
+    emit(prefix, size)
+    if next_code == 1 << size and size < 12:
+        size += 1
+    emit(end, size)
+    if n_bits > 0:
+        out.append(bits & 0xFF)
+    return bytes(out)
+
+
+class GifWriter:
+    """
+    Streams frames of palette indices (as produced by Rasterizer.indices) to an animated GIF.
+    Only the bounding box of the pixels which changed since the previous frame is encoded,
+    and a frame identical to the previous one extends its duration.
+    """
+
+    def __init__(self, path, palette, fps = 10, loop = True):
+        self.file = open(path, "wb")
+        self.palette = np.asarray(palette, dtype=np.uint8)
+        self.delay = max(2, int(round(100. / fps)))     # hundredths of a second
+        self.loop = loop
+        self.table_bits = max(1, int(np.ceil(np.log2(len(self.palette)))))
+        self.min_code_size = max(2, self.table_bits)
+        self.previous = None
+        self.pending = None     # (left, top, indices) of the frame waiting for its duration
+        self.pending_delay = 0
+
+    def header(self, height, width):
+        table = np.zeros((1 << self.table_bits, 3), dtype=np.uint8)
+        table[:len(self.palette)] = self.palette
+        self.file.write(b"GIF89a")
+        self.file.write(np.array([width, height], dtype="<u2").tobytes())
+        self.file.write(bytes([0x80 | ((self.table_bits - 1) << 4) | (self.table_bits - 1), 0, 0]))
+        self.file.write(table.tobytes())
+        if self.loop:
+            self.file.write(b"\x21\xFF\x0BNETSCAPE2.0\x03\x01\x00\x00\x00")
+
+    def add(self, indices):
+        indices = np.asarray(indices, dtype=np.uint8)
+        if self.previous is None:
+            self.header(*indices.shape)
+            self.pending = (0, 0, indices)
+        else:
+            changed = indices != self.previous
+            rows, cols = np.nonzero(changed.any(axis=1))[0], np.nonzero(changed.any(axis=0))[0]
+            if len(rows) == 0:
+                self.pending_delay += self.delay
+                return
+            self.writePending()
+            top, left = rows[0], cols[0]
+            self.pending = (left, top, indices[top:rows[-1]+1, left:cols[-1]+1])
+        self.pending_delay = self.delay
+        self.previous = indices
+
+    def writePending(self):
+        left, top, indices = self.pending
+        height, width = indices.shape
+        delay = min(self.pending_delay, 0xFFFF)
+        # graphic control: leave the frame in place for the next one, then the image descriptor
+        self.file.write(b"\x21\xF9\x04\x04" + np.array([delay], dtype="<u2").tobytes() + b"\x00\x00")
+        self.file.write(b"\x2C" + np.array([left, top, width, height], dtype="<u2").tobytes() + b"\x00")
+        data = lzwEncode(indices.ravel().tolist(), self.min_code_size)
+        self.file.write(bytes([self.min_code_size]))
+        for k in range(0, len(data), 255):
+            block = data[k:k+255]
+            self.file.write(bytes([len(block)]) + block)
+        self.file.write(b"\x00")
+
+    def close(self):
+        if self.pending is not None:
+            self.writePending()
+            self.file.write(b"\x3B")
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class VideoWriter:
+    """
+    Streams RGB frames to a video file (any container and codec ffmpeg picks from the extension)
+    through a local ffmpeg process.
+    """
+
+    def __init__(self, path, fps = 10):
+        self.path = path
+        self.fps = fps
+        self.process = None
+        if shutil.which("ffmpeg") is None:
+            raise RuntimeError("ffmpeg is needed to write {}, use a .gif or .npy file instead".format(path))
+
+    def add(self, rgb):
+        if self.process is None:
+            height, width = rgb.shape[:2]
+            self.process = subprocess.Popen(
+                ["ffmpeg", "-loglevel", "error", "-y", "-f", "rawvideo", "-pix_fmt", "rgb24",
+                 "-s", "{}x{}".format(width, height), "-r", str(self.fps), "-i", "-",
+                 "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2", "-pix_fmt", "yuv420p", self.path],
+                stdin=subprocess.PIPE)
+        self.process.stdin.write(np.ascontiguousarray(rgb, dtype=np.uint8).tobytes())
+
+    def close(self):
+        if self.process is not None:
+            self.process.stdin.close()
+            if self.process.wait() != 0:
+                raise RuntimeError("ffmpeg failed to write {}".format(self.path))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def export(path, states, grid_size, options = None, fps = 10, chunk = 64):
+    """
+    Render `states` to `path`: an animated GIF (.gif), a (n, height, width, 3) uint8 array
+    (.npy) or a video through ffmpeg (any other extension). States are rendered `chunk` at a
+    time, so the same State object may be updated in place between them (as by
+    ReplayReader.states). Returns the number of frames.
+    """
+    rasterizer = Rasterizer(grid_size, options)
+    ext = os.path.splitext(path)[1].lower()
+    n, chunks = 0, []
+    if ext == ".gif":
+        writer = GifWriter(path, rasterizer.palette, fps)
+    elif ext == ".npy":
+        writer = None
+    else:
+        writer = VideoWriter(path, fps)
+
+    grids = rasterizer.emptyCells(chunk)
+    def flush(k):
+        indices = rasterizer.indices(grids[:k])
+        if writer is None:
+            chunks.append(rasterizer.rgb(indices))
+        elif ext == ".gif":
+            for frame in indices:
+                writer.add(frame)
+        else:
+            for frame in rasterizer.rgb(indices):
+                writer.add(frame)
+
+    k = 0
+    for state in states:
+        rasterizer.cells(state, grids[k])
+        k += 1
+        n += 1
+        if k == chunk:
+            flush(k)
+            k = 0
+    if k > 0:
+        flush(k)
+    if writer is None:
+        np.save(path, np.concatenate(chunks) if chunks else
+                np.zeros((0, rasterizer.size, rasterizer.size, 3), dtype=np.uint8))
+    else:
+        writer.close()
+    return n
+
+def exportReplay(replay_path, path, options = None, fps = 10):
+    """
+    Render the game of a replay file (see replay.ReplayWriter) to `path`.
+    """
+    with ReplayReader(replay_path) as reader:
+        return export(path, reader.states(), reader.config.grid_size, options, fps)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Render replays to GIF, video or frame arrays without a display")
+    parser.add_argument("replays", nargs = "+", help = "replay files, or a directory of .replay files")
+    parser.add_argument("--out", default = ".", help = "output file for a single replay, directory otherwise")
+    parser.add_argument("--format", default = "gif", help = "extension of the outputs written in a directory")
+    parser.add_argument("--fps", type = float, default = 10)
+    args = parser.parse_args()
+
+    paths = args.replays
+    if len(paths) == 1 and os.path.isdir(paths[0]):
+        paths = sorted(glob.glob(os.path.join(paths[0], "*.replay")))
+    for replay_path in paths:
+        out = args.out
+        if len(paths) > 1 or os.path.isdir(out):
+            name = os.path.splitext(os.path.basename(replay_path))[0]
+            out = os.path.join(args.out, "{}.{}".format(name, args.format))
+        n = exportReplay(replay_path, out, fps = args.fps)
+        print("{}: {} frames in {}".format(replay_path, n, out))
@@ -0,0 +1,340 @@
+'''
+MIT License
+
+Copyright (c) 2018 Sebastien Dubois, Sebastien Levy, Felix Crevier
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+"""
+Compact binary replays of games, written while the game is played and memory-mapped to read them
+"""
+
+import sys
+import mmap
+import struct
+import numpy as np
+from GameInterface import Game, State
+from snake import newSnake
+from occupancy import Occupancy
+from gameconfig import GameConfig
+from move import Move
+from constants import MOVES, DIRECTIONS, FRUIT_VAL, RandomAgent
+
+# Layout of a replay file (little endian):
+#   header      HEADER, then the size of the initial keyframe and the keyframe itself
+#   ticks       one record of TICK_DTYPE(num_snakes) per tick: the move code of every snake and the
+#               position of the random fruit of the tick, so a tick is found by its index only
+#   keyframes   written by close(): packed states after some ticks, then their index (tick and
+#               offset of each keyframe) and FOOTER
+# A file which was not closed (e.g. the process was killed) is still readable up to its last
+# complete tick, replaying from the initial state.
+
+MAGIC = b"MSRP"
+END_MAGIC = b"MSRE"
+VERSION = 2
+HEADER = struct.Struct("<4sHIIdiqIB")       # magic, version, grid_size, num_snakes, fruit_ratio, max_iter, seed, keyframe_interval, compact_bodies
+FOOTER = struct.Struct("<QQI4s")            # number of ticks, offset of the keyframe index, number of keyframes, END_MAGIC
+KEYFRAME_SIZE = struct.Struct("<I")
+NO_MOVE_CODE = 254                          # the snake is alive but did not give a move (so it dies)
+ABSENT_CODE = 255                           # the snake was not in the moves of the tick (it is dead)
+
+# moves of the codes: MOVES first (the code of a move of MOVES is its id), then the moves of norm
+# 1 or 2 along DIRECTIONS which are not in MOVES (e.g. the accelerated moves of a human player)
+CODE_MOVES = MOVES + [Move(d, n) for n in (1, 2) for d in DIRECTIONS if Move(d, n) not in MOVES]
+CODES = dict((m, code) for code, m in enumerate(CODE_MOVES))
+
+def tickDtype(num_snakes):
+    return np.dtype([("moves", np.uint8, (num_snakes,)), ("fruit", "<u2", (2,))])
+
+def moveCode(m):
+    """
+    Code of move `m` (a Move, a move id or None) in a replay: its index in CODE_MOVES.
+    """
+    if m is None:
+        return NO_MOVE_CODE
+    if m.__class__ is not Move:
+        id_ = int(m)
+        if id_ < 0:
+            return NO_MOVE_CODE
+        m = Move.byId(id_)
+    code = CODES.get(m)
+    if code is None:
+        raise ValueError("move {} of norm {} cannot be recorded".format(m, m.norm()))
+    return code
+
+def packState(state):
+    """
+    The state as a flat int32 array: iteration, snakes (id, points, on_tail, last tail and body),
+    fruits (position and value) and scores of the dead snakes.
+    """
+    data = [state.iter, len(state.snakes), len(state.fruits), len(state.scores)]
+    for id_, s in state.snakes.items():
+        last_tail = s.last_tail if s.last_tail is not None else (-1, -1)
+        data += [id_, s.points, int(s.on_tail), last_tail[0], last_tail[1], len(s.position)]
+        for x, y in s.position:
+            data += [x, y]
+    for (x, y), val in state.fruits.items():
+        data += [x, y, val]
+    for id_, (rank, points) in state.scores.items():
+        data += [id_, rank, points]
+    return np.asarray(data, dtype="<i4").tobytes()
+
+def unpackState(buf, config):
+    """
+    State packed by packState, with the settings of `config`.
+    """
+    data = np.frombuffer(buf, dtype="<i4").tolist()
+    iteration, n_snakes, n_fruits, n_scores = data[:4]
+    i = 4
+    occupancy = Occupancy(config.grid_size)
+    snakes = {}
+    for _ in range(n_snakes):
+        id_, points, on_tail, tx, ty, length = data[i:i+6]
+        i += 6
+        body = list(zip(data[i:i+2*length:2], data[i+1:i+2*length:2]))
+        i += 2 * length
+        snake = newSnake(body, id_, occupancy, compact=config.compact_bodies)
+        snake.points = points
+        snake.on_tail = bool(on_tail)
+        snake.last_tail = (tx, ty) if tx >= 0 else None
+        snakes[id_] = snake
+    state = State(snakes, [], occupancy, config)
+    for _ in range(n_fruits):
+        x, y, val = data[i:i+3]
+        i += 3
+        state._putFruit((x, y), val)
+    for _ in range(n_scores):
+        id_, rank, points = data[i:i+3]
+        i += 3
+        state.scores[id_] = (rank, points)
+    state.iter = iteration
+    return state
+
+
+class ReplayWriter:
+    """
+    Streams the ticks of a game to `path`: start(game, state) with the starting state, then
+    record(game, actions, state) after every Game.tick, and close() at the end.
+    With `keyframe_interval` > 0, the state is also saved every `keyframe_interval` ticks, so that
+    readers can jump to any tick without replaying the whole game.
+    `seed` is the seed of the random generators of the game, if it was seeded (only kept as
+    information: replays do not need it since they store the random fruits).
+    """
+
+    def __init__(self, path, keyframe_interval = 0, seed = None):
+        self.path = path
+        self.keyframe_interval = keyframe_interval
+        self.seed = seed
+        self.file = None
+        self.n_ticks = 0
+        self.keyframes = []     # (tick, packed state)
+
+    def start(self, game, state):
+        config = game.config
+        self.num_snakes = config.num_snakes
+        self.record_dtype = tickDtype(config.num_snakes)
+        self.file = open(self.path, "wb")
+        self.file.write(HEADER.pack(MAGIC, VERSION, config.grid_size, config.num_snakes, config.fruit_ratio,
+                                    -1 if config.max_iter is None else config.max_iter,
+                                    -1 if self.seed is None else self.seed,
+                                    self.keyframe_interval, int(config.compact_bodies)))
+        initial = packState(state)
+        self.file.write(KEYFRAME_SIZE.pack(len(initial)))
+        self.file.write(initial)
+        self.n_ticks = 0
+        self.keyframes = []
+
+    def record(self, game, actions, state):
+        """
+        Write the tick which led to `state`: `actions` given to game.tick and the random fruit it drew.
+        """
+        rec = np.zeros(1, dtype=self.record_dtype)
+        codes = rec["moves"][0]
+        codes[:] = ABSENT_CODE
+        for id_, m in actions.items():
+            codes[id_] = moveCode(m)
+        rec["fruit"][0] = game.last_fruit
+        self.file.write(rec.tobytes())
+        self.n_ticks += 1
+        if self.keyframe_interval > 0 and self.n_ticks % self.keyframe_interval == 0:
+            self.keyframes.append((self.n_ticks, packState(state)))
+
+    def close(self):
+        if self.file is None:
+            return
+        index = np.zeros(len(self.keyframes), dtype=[("tick", "<u4"), ("offset", "<u8")])
+        for k, (tick, packed) in enumerate(self.keyframes):
+            index[k] = (tick, self.file.tell())
+            self.file.write(KEYFRAME_SIZE.pack(len(packed)))
+            self.file.write(packed)
+        index_offset = self.file.tell()
+        self.file.write(index.tobytes())
+        self.file.write(FOOTER.pack(self.n_ticks, index_offset, len(self.keyframes), END_MAGIC))
+        self.file.close()
+        self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ReplayReader:
+    """
+    Memory-mapped replay written by a ReplayWriter. `moves` and `fruits` are read-only
+    (n_ticks, num_snakes) and (n_ticks, 2) views of the file; stateAt(t) rebuilds the state after
+    t ticks from the closest keyframe before it.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, grid_size, num_snakes, fruit_ratio, max_iter, seed, interval, compact = \
+            HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC:
+            raise ValueError("{} is not a replay file".format(path))
+        if version != VERSION:
+            raise ValueError("unsupported replay version {}".format(version))
+        self.config = GameConfig(grid_size, num_snakes, fruit_ratio, None if max_iter < 0 else max_iter,
+                                 bool(compact))
+        self.seed = None if seed < 0 else seed
+        self.keyframe_interval = interval
+        size, = KEYFRAME_SIZE.unpack_from(self.mm, HEADER.size)
+        start = HEADER.size + KEYFRAME_SIZE.size
+        # ticks, keyframe ticks and offsets (the initial state being the keyframe of tick 0)
+        self.keyframe_ticks = [0]
+        self.keyframe_offsets = [HEADER.size]
+        ticks_offset = start + size
+        dtype = tickDtype(num_snakes)
+
+        footer = None
+        if len(self.mm) >= ticks_offset + FOOTER.size:
+            footer = FOOTER.unpack_from(self.mm, len(self.mm) - FOOTER.size)
+        if footer is not None and footer[3] == END_MAGIC:
+            n_ticks, index_offset, n_keyframes, _ = footer
+            index = np.frombuffer(self.mm, dtype=[("tick", "<u4"), ("offset", "<u8")],
+                                  count=n_keyframes, offset=index_offset)
+            self.keyframe_ticks += index["tick"].tolist()
+            self.keyframe_offsets += index["offset"].tolist()
+        else:   # not closed: every complete tick
+            n_ticks = (len(self.mm) - ticks_offset) // dtype.itemsize
+        self.ticks = np.frombuffer(self.mm, dtype=dtype, count=n_ticks, offset=ticks_offset)
+        self.moves = self.ticks["moves"]
+        self.fruits = self.ticks["fruit"]
+
+    def __len__(self):
+        return len(self.ticks)
+
+    def movesAt(self, t):
+        """
+        Moves {id => Move or None} of tick t (0-based: the tick from state t to state t+1), in id
+        order as in Game.agentActions.
+        """
+        return {id_: (CODE_MOVES[code] if code < NO_MOVE_CODE else None)
+                for id_, code in enumerate(self.moves[t].tolist()) if code != ABSENT_CODE}
+
+    def keyframe(self, k):
+        offset = self.keyframe_offsets[k]
+        size, = KEYFRAME_SIZE.unpack_from(self.mm, offset)
+        start = offset + KEYFRAME_SIZE.size
+        return unpackState(self.mm[start:start+size], self.config)
+
+    def stateAt(self, t):
+        """
+        State after t ticks (t = 0 being the starting state), t <= len(self).
+        """
+        if not 0 <= t <= len(self):
+            raise IndexError("tick {} out of range of a replay of {} ticks".format(t, len(self)))
+        k = int(np.searchsorted(self.keyframe_ticks, t, side="right")) - 1
+        state = self.keyframe(k)
+        for tick in range(self.keyframe_ticks[k], t):
+            self.step(state, tick)
+        return state
+
+    def step(self, state, t):
+        """
+        Replay tick t on `state` (in place), as Game.tick does.
+        """
+        state.update(self.movesAt(t))
+        state.addFruit(tuple(self.fruits[t].tolist()), FRUIT_VAL)
+        return state
+
+    def states(self):
+        """
+        Iterate over the states of the game, from the starting state to the final one. The same
+        State object is updated in place.
+        """
+        state = self.keyframe(0)
+        yield state
+        for t in range(len(self)):
+            yield self.step(state, t)
+
+    def close(self):
+        self.ticks = self.moves = self.fruits = None
+        self.mm.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def checkRoundTrip(path, grid_size = 15, num_snakes = 2, accelerate_at = 3):
+    """
+    Record to `path` a game of random agents where snake 0 accelerates at tick `accelerate_at`,
+    then check that the replay gives back the moves and every state of the game, from the start
+    and from the keyframes. Returns the number of ticks checked.
+    """
+    game = Game(grid_size, num_snakes, max_iter = 50)
+    state = game.start([RandomAgent] * num_snakes)
+    writer = ReplayWriter(path, keyframe_interval = 4)
+    writer.start(game, state)
+    played, moves = [packState(state)], []
+    while not game.isEnd(state):
+        actions = game.agentActions()
+        if len(moves) == accelerate_at and actions.get(0) is not None:
+            actions[0] = Move(actions[0].direction(), 2.)
+        state = game.tick(state, actions, copy = False)
+        writer.record(game, actions, state)
+        played.append(packState(state))
+        moves.append(actions)
+    writer.close()
+
+    with ReplayReader(path) as reader:
+        if len(reader) != len(moves):
+            raise AssertionError("{} ticks replayed instead of {}".format(len(reader), len(moves)))
+        for t, actions in enumerate(moves):
+            if reader.movesAt(t) != actions:
+                raise AssertionError("moves {} replayed instead of {} at tick {}".format(reader.movesAt(t), actions, t))
+        for t, state in enumerate(reader.states()):
+            if packState(state) != played[t]:
+                raise AssertionError("state {} differs from the game".format(t))
+        for t in range(len(played)):
+            if packState(reader.stateAt(t)) != played[t]:
+                raise AssertionError("state {} differs from the game when read from a keyframe".format(t))
+    return len(moves)
+
+
+if __name__ == "__main__":
+    # python replay.py <path>: record a game with an accelerated move to <path> and check it replays exactly
+    print("{} ticks replayed exactly".format(checkRoundTrip(sys.argv[1])))
@@ -22,36 +22,103 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 '''
 
-import sys
+import os, sys, random
 import numpy as np
+from multiprocessing import Pool
 from time import sleep, time
 
 import config
 from hp import *
 from utils import progressBar
-from controller import controller
+from headless import runHeadless
+from replay import ReplayWriter
+from instrument import Profiler
 from strategies import randomStrategy
-from features import FeatureExtractor
 
-def simulate(n_simul, agents, grid_size, fruit_ratio = 1., max_iter = 500):
+def gameSeeds(master_seed, n_simul):
+    """
+    Seeds of the `n_simul` games of a tournament, derived from `master_seed` only.
+    """
+    return [int(s.generate_state(1)[0]) for s in np.random.SeedSequence(master_seed).spawn(n_simul)]
+
+def playGame(agents, grid_size, fruit_ratio = 1., max_iter = 500, seed = None, replay_path = None, profile = False):
+    """
+    Play one game, seeding the global random generators first if `seed` is given, and recording
+    it in a binary replay (see replay.py) if `replay_path` is given.
+    Returns the winner (None if there is none), its points, the scores, the number of iterations
+    and, with `profile`, the summary of an instrument.Profiler of the game (None otherwise).
+    """
+    if seed is not None:
+        random.seed(seed)
+        np.random.seed(seed)
+    replay = ReplayWriter(replay_path, seed = seed) if replay_path is not None else None
+    profiler = Profiler() if profile else None
+    endState, _ = runHeadless(agents, grid_size, fruit_ratio = fruit_ratio, max_iter = max_iter, replay = replay,
+                              profiler = profiler)
+    winner, winner_points = None, None
+    if len(endState.snakes) == 1:
+        winner = list(endState.snakes.keys())[0]
+        winner_points = list(endState.snakes.values())[0].points
+    return winner, winner_points, endState.scores, endState.iter, profiler.summary() if profile else None
+
+def _playGame(args):
+    return playGame(*args)
+
+def simulate(n_simul, agents, grid_size, fruit_ratio = 1., max_iter = 500, n_workers = 1, seed = None,
+             replay_dir = None, profiler = None):
+    """
+    Play `n_simul` games. With `n_workers` > 1, games are sharded over a process pool.
+    When `seed` is given (always the case with several workers) every game is seeded from it,
+    so that results do not depend on the number of workers.
+    With `replay_dir`, game k is recorded in replay_dir/game_<k>.replay.
+    With `profiler` (an instrument.Profiler), the timings of all the games are added to it.
+    """
     print("Simulations")
     wins = dict((id, 0.) for id in range(len(agents)))
     points = dict((id, []) for id in range(len(agents)))
     scores = dict((id, []) for id in range(len(agents)))
 
+    if seed is None and n_workers > 1:
+        seed = random.randrange(2**32)
+    seeds = gameSeeds(seed, n_simul) if seed is not None else [None] * n_simul
+    if replay_dir is not None:
+        os.makedirs(replay_dir, exist_ok = True)
+        replays = [os.path.join(replay_dir, "game_{:06d}.replay".format(k)) for k in range(n_simul)]
+    else:
+        replays = [None] * n_simul
+    games = [(agents, grid_size, fruit_ratio, max_iter, s, r, profiler is not None) for s, r in zip(seeds, replays)]
+
+    pool = None
+    if n_workers > 1:
+        pool = Pool(n_workers)
+        results = pool.imap(_playGame, games, chunksize = max(1, n_simul // (4 * n_workers)))
+    else:
+        results = map(_playGame, games)
+
     iterations = []
-    for it in range(n_simul):
-        progressBar(it, n_simul)
-        endState = controller(agents, grid_size, fruit_ratio = fruit_ratio, max_iter = max_iter, verbose = 0)
-        if len(endState.snakes) == 1:
-            wins[list(endState.snakes.keys())[0]] += 1. / n_simul
-            points[list(endState.snakes.keys())[0]].append(list(endState.snakes.values())[0].points)
-
-        for id in range(len(agents)):
-            temp = endState.scores[id]
-            scores[id].append(temp)
-
-        iterations.append(endState.iter)
+    try:
+        for it, (winner, winner_points, endScores, n_iter, profile) in enumerate(results):
+            progressBar(it, n_simul)
+            if profile is not None:
+                profiler.merge(profile)
+            if winner is not None:
+                wins[winner] += 1. / n_simul
+                points[winner].append(winner_points)
+
+            for id in range(len(agents)):
+                temp = endScores[id]
+                scores[id].append(temp)
+
+            iterations.append(n_iter)
+    except BaseException:
+        # don't wait for the games left in the queue
+        if pool is not None:
+            pool.terminate()
+        raise
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
     progressBar(n_simul, n_simul)
     points = dict((id, sum(val)/len(val)) for id,val in points.items())
     return wins, points, scores, iterations
@@ -67,14 +134,23 @@ if __name__ ==  "__main__":
 
     print("Simulation config:", ["{} = {}".format(k,v) for k,v in config.__dict__.items() if not k.startswith('__')])
 
+    n_workers = int(sys.argv[2]) if len(sys.argv) > 2 else config.num_workers
+
     strategies = config.opponents
     game_hp = config.game_hp
 
+    profiler = Profiler() if getattr(config, "profile", False) else None
     start = time()
-    wins, points, scores, iterations = simulate(n_simul, strategies, game_hp.grid_size, max_iter = MAX_ITER)
+    wins, points, scores, iterations = simulate(n_simul, strategies, game_hp.grid_size, max_iter = MAX_ITER,
+                                           n_workers = n_workers, seed = config.seed, profiler = profiler)
     tot_time = time() - start
 
-    with open("experiments/{}_{}_{}.txt".format(config.filename, "-".join([s.__str__() for s in strategies]), config.comment), "w") as fout:
+    run_name = "experiments/{}_{}_{}".format(config.filename, "-".join([s.__str__() for s in strategies]), config.comment)
+    if profiler is not None:
+        profiler.dump(run_name + "_profile.json")
+        print("\n" + profiler.report())
+
+    with open(run_name + ".txt", "w") as fout:
         print("\n\n=======Results=======", file=fout)
         print("Run {} simulations".format(n_simul), file=fout)
         print("Max iteration:", MAX_ITER, "\n", file=fout)
@@ -93,5 +169,5 @@ if __name__ ==  "__main__":
 
         print("\n\nParams", file=fout)
         print("\n".join(
-            ["{} = {}".format(k, config.__dict__[k] if k != "opponents" else ", ".join([str(o) for o in config.__dict__[k]])) for k in ["agent", "filename", "game_hp", "depth", "num_trials", "opponents", "comment"]]
+            ["{} = {}".format(k, config.__dict__[k] if k != "opponents" else ", ".join([str(o) for o in config.__dict__[k]])) for k in ["agent", "filename", "game_hp", "depth", "num_trials", "num_workers", "seed", "opponents", "comment"]]
         ), file=fout)
@@ -22,24 +22,48 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 '''
 
-import numpy as np
 from collections import deque
 import utils
-from constants import NORM_MOVES, FRUIT_VAL, FRUIT_BONUS
+from occupancy import Occupancy
+from cellring import CellRing
+from areatable import bodyTable, rectSum
+from move import toMove
+from constants import MOVES, NORM_MOVES, FRUIT_VAL, FRUIT_BONUS
 
 class newSnake:
-    grid_size = None
-
-    def __init__(self, position, i=0):
-        self.position = deque(position)
+    def __init__(self, position, i=0, occupancy=None, grid_size=None, compact=False):
         self.points = len(position) * FRUIT_BONUS
         self.on_tail = False
         self.last_tail = None
-        self.bool_pos = np.zeros((self.grid_size, self.grid_size)) #array of nxn
         self.id = i
+        # grid shared with the other snakes of the state (a private one of size grid_size if none is given)
+        if occupancy is None:
+            occupancy = Occupancy(grid_size)
+        self.occupancy = occupancy
+        self.grid_size = occupancy.grid_size
+        # compact bodies store flat cell indices, see cellring.CellRing
+        self.position = CellRing(position, self.grid_size) if compact else deque(position)
+        # bumped by every change of the body, to know when the cached legal moves are stale
+        self.version = 0
+        self.legal_cache = {}
         for pos in position:
-            #        pos = tuple(map(int, pos))
-            self.bool_pos[pos] = 1
+            self.occupancy.add(pos, self.id)
+
+    def setOccupancy(self, occupancy):
+        """
+        Register the snake's body in `occupancy`, which becomes its grid.
+        """
+        self.occupancy = occupancy
+        self.grid_size = occupancy.grid_size
+        for pos in self.position:
+            self.occupancy.add(pos, self.id)
+
+    def release(self):
+        """
+        Remove the snake's body from its occupancy grid, e.g. when it dies.
+        """
+        for pos in self.position:
+            self.occupancy.remove(pos, self.id)
 
     def head(self):
         return self.position[0]
@@ -48,67 +72,115 @@ class newSnake:
         return move.apply(self.head())
 
     def onSnake(self, pos):
-        return self.bool_pos[pos] > 0
+        return self.occupancy.countOf(pos, self.id) > 0
 
     def onSnakeOrNotGrid(self, pos):
         return not utils.isOnGrid(pos, self.grid_size) or self.onSnake(pos)
 
     def countSnake(self, pos):
-        return self.bool_pos[pos]
+        return self.occupancy.countOf(pos, self.id)
 
     def onSnakeExceptLastOrNotGrid(self, pos, n):
-        return not utils.isOnGrid(pos, self.grid_size) or \
-               (self.countSnake(pos) - sum(int(self.position[-i] == pos) for i in range(1,n+1)) >= 1)
+        if not utils.isOnGrid(pos, self.grid_size):
+            return True
+        count = self.countSnake(pos)
+        for i in range(1, n+1):
+            if self.position[-i] == pos:
+                count -= 1
+        return count >= 1
 
     def pop(self):
         tail = self.position.pop()
-        self.bool_pos[tail] -= 1
+        self.occupancy.remove(tail, self.id)
         self.last_tail = tail
+        self.version += 1
         return tail
 
     def popleft(self):
         head = self.position.popleft()
-        self.bool_pos[head] -= 1
+        self.occupancy.remove(head, self.id)
+        self.version += 1
 
     def add(self, pos):
-        self.bool_pos[pos] += 1
+        self.occupancy.add(pos, self.id)
         self.position.appendleft(pos)
+        self.version += 1
+
+    def addHead(self, direction):
+        """
+        Add a segment one step from the head along `direction`, return its position and whether it
+        was already on the snake. Compact bodies shift the head's cell, so no tuple is built.
+        """
+        body = self.position
+        if body.__class__ is CellRing:
+            cell = body.shiftedHead(direction)
+            head = body.positions[cell]
+            on_snake = self.onSnake(head)
+            self.occupancy.add(head, self.id)
+            body.appendleftCell(cell)
+            self.version += 1
+        else:
+            head = utils.add(body[0], direction)
+            on_snake = self.onSnake(head)
+            self.add(head)
+        return head, on_snake
 
     def addRight(self, pos):
-        self.bool_pos[pos] += 1
+        self.occupancy.add(pos, self.id)
         self.position.append(pos)
+        self.version += 1
+
+    def legalMoves(self, simple=False):
+        '''
+        The MOVES which stay on the grid and are authorized (only those of norm 1 if simple).
+        The result is cached until the body or on_tail changes, so all the callers of a tick share it.
+        '''
+        key = (self.version, self.on_tail)
+        cached = self.legal_cache.get(simple)
+        if cached is None or cached[0] != key:
+            head = self.head()
+            if simple:
+                moves = [m for m in MOVES if m.norm() == 1
+                         and utils.isOnGrid(m.apply(head), self.grid_size)
+                         and self.authorizedMove(m, possibleNorm=[1])]
+            else:
+                moves = [m for m in MOVES
+                         if utils.isOnGrid(m.apply(head), self.grid_size)
+                         and self.authorizedMove(m)]
+            cached = (key, moves)
+            self.legal_cache[simple] = cached
+        return list(cached[1])
+
+    def countInArea(self, pos, radius):
+        """
+        Number of cells of the snake in the square of radius `radius` around `pos`, in O(1) from the
+        summed-area table of its body.
+        """
+        table = bodyTable(self.occupancy, self.id)
+        return rectSum(table, pos[0] - radius, pos[0] + radius + 1, pos[1] - radius, pos[1] + radius + 1)
 
     def isInArea(self, pos, radius):
-        for i in range(max(-radius+pos[0],0), min(radius+pos[0]+1, self.grid_size)):
-            for j in range(max(-radius+pos[1],0), min(radius+pos[1]+1, self.grid_size)):
-                if self.onSnake((i,j)):
-                    return True
-        return False
+        return self.countInArea(pos, radius) > 0
 
     def compactRate(self, radius):
-        pos = self.head()
-        num = 0
-        for i in range(max(-radius+pos[0],0), min(radius+pos[0]+1, self.grid_size)):
-            for j in range(max(-radius+pos[1],0), min(radius+pos[1]+1, self.grid_size)):
-                if self.bool_pos[(i,j)]:
-                    num += 1
-        return float(num)/((2*radius+1)**2 - 1)
+        return float(self.countInArea(self.head(), radius))/((2*radius+1)**2 - 1)
 
 
     def authorizedMove(self, move, possibleNorm=NORM_MOVES):
         '''
         Returns if the move is authorized given a optional direction for the collision constraints
-        :param move: the move to check
+        :param move: the move to check (or its id)
         :param possibleNorm: check only the norm provided
         :return: a boolean true if the position is authorized
         '''
+        move = toMove(move)
         head = self.head()
+        target = move.applyDirection(head)
 
-        # backward moves are forbidden
-        if move.direction() == utils.mult(self.orientation(), -1):
+        # backward moves are forbidden (going back onto the neck, compared without building the orientation)
+        if target == self.position[1]:
             return False
 
-        target = move.applyDirection(head)
         # If a collision already occurred we can't do another one
         if (self.on_tail and self.onSnakeExceptLastOrNotGrid(target, 1)):
             return False
@@ -144,33 +216,31 @@ class newSnake:
         '''
         Moves according the direction vectors, if it accelerates, returns the position to put a fruit on
         :param move: a (direction, norm) tuple with direction being the tuple encoding the direction
-        and norm being 1 for a normal move and 2 for acceleration
+        and norm being 1 for a normal move and 2 for acceleration (or its id)
         :return: None if the snake didn't accelerate, the position to put a fruit on, if it did accelerate
         '''
+        move = toMove(move)
         norm, direction = move.norm(), move.direction()
         self.on_tail = False
         if norm == 2:
             self.pop()
             before_last_tail = self.pop()
-            self.add(utils.add(self.position[0], direction))
-            new_head = utils.add(self.position[0], direction)
-            if self.onSnake(new_head):
+            self.addHead(direction)
+            _, on_snake = self.addHead(direction)
+            if on_snake:
                 self.on_tail = True
-            self.add(new_head)
             self.removePoints(FRUIT_VAL)
             return before_last_tail
 
         self.pop()
-        head = utils.add(self.head(), direction)
+        head, on_snake = self.addHead(direction)
         if not utils.isOnGrid(head, self.grid_size):
             print (head)
             print (self.id)
             print (self.position)
-            print (self.bool_pos)
             print (self)
-        if self.onSnake(head):
+        if on_snake:
             self.on_tail = True
-        self.add(head)
         return None
 
     def __len__(self):
@@ -3,8 +3,23 @@ Strategies for players.
 """
 from operator import itemgetter
 from utils import *
+from territory import territory
+from fruitfield import fruitField
 import random
 
+def fruitDistance(state, pos, paths = False):
+    """
+    Distance from `pos` to the closest fruit: Manhattan, or with `paths` the length of the shortest
+    path over the free cells from the fruit distance field of the state. Positions from which no
+    fruit can be reached are then ranked after all the others, by Manhattan distance.
+    """
+    if paths:
+        d = fruitField(state).distance(pos)
+        if d != float("inf"):
+            return d
+        return state.grid_size ** 2 + state.nearestFruit(pos)[0]
+    return state.nearestFruit(pos)[0]
+
 def humanStrategy(id, state):
     return None
 
@@ -17,10 +32,10 @@ def randomStrategy(id, state):
         return None
     return random.sample(actions, 1)[0]
 
-def greedyStrategy(id, state):
+def greedyStrategy(id, state, paths = False):
     """
     Take action which brings us closest to a fruit - without even
-    looking at other snakes.
+    looking at other snakes. With `paths`, distances are path lengths around the bodies.
     """
     actions = state.simple_actions(id)
     head = state.snakes[id].position[0]
@@ -28,14 +43,18 @@ def greedyStrategy(id, state):
         return None
     if len(state.fruits) == 0:
         return random.sample(actions, 1)[0]
-    best_move = min(((dist(move.apply(head), fruit), move)
-                    for fruit in state.fruits.keys() for move in actions), key=itemgetter(0))
-    return best_move[1]
+    if paths:
+        return min(actions, key=lambda move: fruitDistance(state, move.apply(head), paths))
+    # closest fruit of each move, ties broken by fruit order then move order
+    best_move = min(((state.nearestFruit(move.apply(head))[:2], i, move)
+                    for i, move in enumerate(actions)), key=itemgetter(0, 1))
+    return best_move[2]
 
-def opportunistStrategy(id, state):
+def opportunistStrategy(id, state, paths = False):
     """
     Take action which brings us closest to a fruit
     Checks if we're hitting another snake
+    With `paths`, take the action with the shortest path to a fruit around the bodies instead.
     """
     snake = state.snakes[id]
     # Computing the list of actions that won't kill the snake
@@ -50,14 +69,45 @@ def opportunistStrategy(id, state):
     if len(state.fruits) == 0:
         return random.sample(actions, 1)[0]
 
-    min_dist = dict(((fruit, min(dist(s.position[0], fruit) for s in state.snakes.values()))
-                    for fruit in state.fruits.keys()), key=itemgetter(1))
-    best_move = min(((dist(snake.predictHead(move), fruit) - min_dist[fruit],
-                     dist(snake.predictHead(move), fruit), move)
-                    for fruit in state.fruits.keys() for move in actions), key=itemgetter(0))
+    if paths:
+        return min(actions, key=lambda move: fruitDistance(state, snake.predictHead(move), paths))
+
+    # Visit fruits from the closest one. A move can't score better than -1 (the snake is the closest
+    # to the fruit and gets closer), so we stop at the first fruit reaching it
+    heads = [s.position[0] for s in state.snakes.values()]
+    best_move = None
+    for _, _, fruit in state.fruit_index.iterNearest(snake.position[0]):
+        min_dist = min(dist(h, fruit) for h in heads)
+        for move in actions:
+            d = dist(snake.predictHead(move), fruit)
+            if best_move is None or d - min_dist < best_move[0]:
+                best_move = (d - min_dist, d, move)
+        if best_move[0] == -1:
+            break
     return best_move[2]
 
-def simpleHillClimbingStrategy(id, state):
+def spaceAwareStrategy(id, state):
+    """
+    Opportunist which keeps room to live: only the moves leaving at least as many reachable cells
+    as the snake's length are considered (the roomiest ones if there are none), then the move
+    getting closest to a fruit, ties broken by the territory it keeps.
+    """
+    snake = state.snakes[id]
+    actions = [m for m in state.simple_actions(id)
+               if not state.onOtherSnakes(snake.predictHead(m), id)]
+    if len(actions) == 0:
+        return None
+
+    scores = territory(state).moveScores(id)
+    room = [m for m in actions if scores[m][0] >= len(snake)]
+    if len(room) == 0:
+        most = max(scores[m][0] for m in actions)
+        room = [m for m in actions if scores[m][0] == most]
+    if len(state.fruits) == 0:
+        return max(room, key=lambda m: scores[m][1])
+    return min(room, key=lambda m: (state.nearestFruit(snake.predictHead(m))[0], -scores[m][1]))
+
+def simpleHillClimbingStrategy(id, state, paths = False):
     snake = state.snakes[id]
     # Get list of possible actions that do not result in collisions with other snakes
     actions = [move for move in state.simple_actions(id) if not state.onOtherSnakes(snake.predictHead(move), id)]
@@ -69,10 +119,12 @@ def simpleHillClimbingStrategy(id, state):
     if len(state.fruits) == 0:
         return random.sample(actions, 1)[0]
     # Choose the move that results in the greatest reduction in distance to a fruit
-    best_move = min(((dist(snake.predictHead(move), fruit), move) for fruit in state.fruits.keys() for move in actions), key=itemgetter(0))
-    return best_move[1]
+    if paths:
+        return min(actions, key=lambda move: fruitDistance(state, snake.predictHead(move), paths))
+    best_move = min(((state.nearestFruit(snake.predictHead(move))[:2], i, move) for i, move in enumerate(actions)), key=itemgetter(0, 1))
+    return best_move[2]
 
-def weightedHillClimbingStrategy1(id, state):
+def weightedHillClimbingStrategy1(id, state, paths = False):
     snake = state.snakes[id]
     otherSnakes = []
     for x in list(state.snakes.keys()):
@@ -91,18 +143,18 @@ def weightedHillClimbingStrategy1(id, state):
     if len(state.fruits) == 0:
         return random.sample(actions, 1)[0]
     # Choose the move that results in the greatest reduction in distance to a fruit
-    minScore = (state.grid_size + 1) * 2
+    minScore = float("inf")
     minAction = None
     for action in actions:
         closestSnakeDist = min(dist(snake.predictHead(action), s.position[0]) for s in otherSnakes)
-        closestFruitDist = min(dist(snake.predictHead(action), fruit) for fruit in state.fruits.keys())
+        closestFruitDist = fruitDistance(state, snake.predictHead(action), paths)
         currentScore = closestFruitDist - closestSnakeDist
         if minScore > currentScore:
             minScore = currentScore
             minAction = action
     return minAction
 
-def weightedHillClimbingStrategyPoint5(id, state):
+def weightedHillClimbingStrategyPoint5(id, state, paths = False):
     snake = state.snakes[id]
     otherSnakes = []
     for x in list(state.snakes.keys()):
@@ -125,14 +177,14 @@ def weightedHillClimbingStrategyPoint5(id, state):
     minAction = None
     for action in actions:
         closestSnakeDist = min(dist(snake.predictHead(action), s.head()) for s in otherSnakes)
-        closestFruitDist = min(dist(snake.predictHead(action), fruit) for fruit in state.fruits.keys())
+        closestFruitDist = fruitDistance(state, snake.predictHead(action), paths)
         currentScore = closestFruitDist - (closestSnakeDist) * 0.5
         if minScore > currentScore:
             minScore = currentScore
             minAction = action
     return minAction
 
-def weightedHillClimbingStrategyPoint33(id, state):
+def weightedHillClimbingStrategyPoint33(id, state, paths = False):
     snake = state.snakes[id]
     otherSnakes = []
     for x in list(state.snakes.keys()):
@@ -155,7 +207,7 @@ def weightedHillClimbingStrategyPoint33(id, state):
     minAction = None
     for action in actions:
         closestSnakeDist = min(dist(snake.predictHead(action), s.head()) for s in otherSnakes)
-        closestFruitDist = min(dist(snake.predictHead(action), fruit) for fruit in state.fruits.keys())
+        closestFruitDist = fruitDistance(state, snake.predictHead(action), paths)
         currentScore = closestFruitDist - (closestSnakeDist) * 0.33
         if minScore > currentScore:
             minScore = currentScore
@@ -0,0 +1,178 @@
+'''
+MIT License
+
+Copyright (c) 2018 Sebastien Dubois, Sebastien Levy, Felix Crevier
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+"""
+Territory of the snakes: cells each snake can reach and cells it reaches before the others
+"""
+
+import weakref
+import numpy as np
+import utils
+
+NOBODY = -1     # owner of the cells no snake can reach
+TIE = -2        # owner of the cells several snakes reach first at the same time
+
+_cache = weakref.WeakKeyDictionary()    # state => (key, Territory)
+
+def territory(state):
+    """
+    Territory of `state`, computed once per state and body changes of its snakes, so that all the
+    agents and feature extractors of a tick share it.
+    """
+    key = (state.iter, tuple((id_, s.version) for id_, s in state.snakes.items()))
+    cached = _cache.get(state)
+    if cached is None or cached[0] != key:
+        cached = (key, Territory(state))
+        _cache[state] = cached
+    return cached[1]
+
+def gridGraph(free, sources):
+    """
+    Directed graph of the cells of a grid (flat x-major indices): an edge from each free cell or
+    source to each of its free neighbours. `free` and `sources` are boolean (G, G) arrays.
+    """
+    # scipy is only imported when a graph is built, so that the game loop doesn't load it
+    from scipy.sparse import csr_matrix
+    G = free.shape[0]
+    idx = np.arange(G * G).reshape(G, G)
+    start = free | sources
+    rows, cols = [], []
+    for a, b in [((slice(None, -1), slice(None)), (slice(1, None), slice(None))),
+                 ((slice(1, None), slice(None)), (slice(None, -1), slice(None))),
+                 ((slice(None), slice(None, -1)), (slice(None), slice(1, None))),
+                 ((slice(None), slice(1, None)), (slice(None), slice(None, -1)))]:
+        edges = start[a] & free[b]
+        rows.append(idx[a][edges])
+        cols.append(idx[b][edges])
+    rows, cols = np.concatenate(rows), np.concatenate(cols)
+    return csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(G * G, G * G))
+
+
+class Territory:
+    """
+    Multi-source BFS from the heads of the snakes on the free cells of a state (bodies are obstacles
+    as they are in the state). For each snake, `reachable` is the number of free cells it can
+    reach and `owned` the number of those it reaches strictly before every other snake.
+    moveScores evaluates the candidate moves of the snakes the same way: the snake moved to its
+    target (one tick ahead) against the other snakes where they are. The distances from all the
+    heads and all the candidate targets are computed in a single C BFS (scipy.sparse.csgraph),
+    the first time they are needed.
+    """
+
+    def __init__(self, state):
+        self.grid_size = G = state.grid_size
+        self.ids = list(state.snakes.keys())
+        self.heads = [state.snakes[id_].head() for id_ in self.ids]
+        self.free = state.occupancy.count == 0
+        # id => [(move, target cell)] for the moves to a cell of the grid which is free or on the snake
+        # itself (a snake may cross its own body once); the others are deadly
+        self.candidates = {}
+        self.deadly = {}
+        sources = np.zeros((G, G), dtype=bool)
+        for id_, head in zip(self.ids, self.heads):
+            sources[head] = True
+            self.candidates[id_], self.deadly[id_] = [], []
+            for m in state.actions(id_):
+                target = m.apply(head)
+                if utils.isOnGrid(target, G) and state.occupancy.countOthers(target, id_) == 0:
+                    self.candidates[id_].append((m, target))
+                    sources[target] = True
+                else:
+                    self.deadly[id_].append(m)
+        self.sources = sources
+        self.dist = None
+        self.row = {}           # cell => row of the cell in dist
+        self._owner = None
+        self._scores = {}
+
+    def distances(self):
+        """
+        (n_sources, G, G) BFS distances (inf if unreachable) from the heads and candidate targets.
+        """
+        if self.dist is None:
+            from scipy.sparse.csgraph import dijkstra
+            cells = list(dict.fromkeys(self.heads + [t for id_ in self.ids for _, t in self.candidates[id_]]))
+            self.row = dict((c, i) for i, c in enumerate(cells))
+            G = self.grid_size
+            graph = gridGraph(self.free, self.sources)
+            dist = dijkstra(graph, indices=[x * G + y for x, y in cells], unweighted=True)
+            self.dist = dist.reshape(len(cells), G, G)
+        return self.dist
+
+    def distance(self, id_):
+        """
+        (G, G) distances from the head of snake `id_`.
+        """
+        return self.distances()[self.row[self.heads[self.ids.index(id_)]]]
+
+    def headDistances(self):
+        dist = self.distances()
+        return dist[[self.row[h] for h in self.heads]]
+
+    def owner(self):
+        """
+        (G, G) id of the snake reaching each free cell first, NOBODY or TIE.
+        """
+        if self._owner is None:
+            dist = self.headDistances()
+            best = dist.min(axis=0)
+            first = dist.argmin(axis=0)
+            ties = (dist == best).sum(axis=0) > 1
+            owner = np.asarray(self.ids, dtype=np.int16)[first]
+            owner[ties] = TIE
+            owner[~np.isfinite(best) | ~self.free] = NOBODY
+            self._owner = owner
+        return self._owner
+
+    def reachable(self, id_):
+        return int((np.isfinite(self.distance(id_)) & self.free).sum())
+
+    def owned(self, id_):
+        return int((self.owner() == id_).sum())
+
+    def scores(self):
+        """
+        {id => (reachable, owned)} for the snakes of the state.
+        """
+        return dict((id_, (self.reachable(id_), self.owned(id_))) for id_ in self.ids)
+
+    def moveScores(self, id_):
+        """
+        {move => (reachable, owned)} of the legal moves of snake `id_`: cells reachable from the target
+        of the move (itself excluded), and cells it reaches before the other snakes, counting the tick
+        of the move. Moves to a cell off the grid or occupied by another snake are worth (0, 0).
+        """
+        if id_ not in self._scores:
+            dist = self.distances()
+            k = self.ids.index(id_)
+            others = [self.row[h] for i, h in enumerate(self.heads) if i != k]
+            nearest_other = dist[others].min(axis=0) if others else np.full(self.free.shape, np.inf)
+            scores = dict((m, (0, 0)) for m in self.deadly[id_])
+            for m, target in self.candidates[id_]:
+                mine = dist[self.row[target]] + 1
+                reach = np.isfinite(mine) & self.free
+                reach[target] = False
+                scores[m] = (int(reach.sum()), int((reach & (mine < nearest_other)).sum()))
+            self._scores[id_] = scores
+        return self._scores[id_]
@@ -38,6 +38,8 @@ def add(tuple1, tuple2, mu = 1):
     """
     Return tuple1 + mu * tuple2.
     """
+    if len(tuple1) == 2:
+        return (tuple1[0] + mu * tuple2[0], tuple1[1] + mu * tuple2[1])
     return tuple([tuple1[i] + mu * tuple2[i] for i in range(len(tuple1))])
 
 def mult(t, mu):
@@ -0,0 +1,180 @@
+'''
+MIT License
+
+Copyright (c) 2018 Sebastien Dubois, Sebastien Levy, Felix Crevier
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+"""
+Zobrist hashing of game states and transposition table for tree search
+"""
+
+import numpy as np
+
+class ZobristKeys:
+    """
+    Random 64 bits keys for the components of a state of a `grid_size` grid with `n_snakes` snakes:
+    body segments (per snake, cell and number of segments already there), heads, tails, fruits
+    (per value), on_tail flags, points (modulo POINTS) and the agent to move.
+    Keys are drawn from a fixed seed so that hashes agree across processes. The keys of a fruit
+    value are drawn the first time it is seen, from (seed, value), so they don't depend on the
+    order in which the values show up.
+    """
+
+    LEVELS = 3
+    POINTS = 256
+    _cache = {}
+
+    def __init__(self, grid_size, n_snakes, seed = 0):
+        rng = np.random.default_rng(seed)
+        def draw(*shape):
+            return rng.integers(0, 2**64, size=shape, dtype=np.uint64, endpoint=False)
+        self.grid_size = grid_size
+        self.n_snakes = n_snakes
+        self.body = draw(n_snakes, grid_size, grid_size, self.LEVELS)
+        self.heads = draw(n_snakes, grid_size, grid_size)
+        self.tails = draw(n_snakes, grid_size, grid_size)
+        self.on_tail = draw(n_snakes)
+        self.points = draw(n_snakes, self.POINTS)
+        self.turn = draw(n_snakes)
+        self.fruits = {}
+        self.seed = seed
+
+    @classmethod
+    def get(cls, grid_size, n_snakes):
+        """
+        Shared keys for a given grid size and number of snakes.
+        """
+        if (grid_size, n_snakes) not in cls._cache:
+            cls._cache[(grid_size, n_snakes)] = cls(grid_size, n_snakes)
+        return cls._cache[(grid_size, n_snakes)]
+
+    def __deepcopy__(self, memo):
+        # keys are immutable, copies of a state share them
+        return self
+
+    def segment(self, id, pos, level):
+        """
+        Key of the `level`-th segment (0 for the first one) of snake `id` at `pos`.
+        Counts beyond LEVELS reuse the last key.
+        """
+        return int(self.body[id, pos[0], pos[1], min(level, self.LEVELS - 1)])
+
+    def fruit(self, pos, val):
+        if val not in self.fruits:
+            rng = np.random.default_rng([self.seed, val])
+            self.fruits[val] = rng.integers(0, 2**64, size=(self.grid_size, self.grid_size), dtype=np.uint64, endpoint=False)
+        return int(self.fruits[val][pos])
+
+    def snake(self, snake):
+        """
+        Hash of the components of `snake` which are not maintained incrementally.
+        """
+        id = snake.id
+        h = int(self.heads[id][snake.position[0]]) ^ int(self.tails[id][snake.position[-1]])
+        h ^= int(self.points[id, snake.points % self.POINTS])
+        if snake.on_tail:
+            h ^= int(self.on_tail[id])
+        return h
+
+    def full(self, occupancy, fruits):
+        """
+        Hash of the body segments in `occupancy` and of `fruits`, computed from scratch.
+        """
+        h = 0
+        for x, y in zip(*np.nonzero(occupancy.count)):
+            pos = (int(x), int(y))
+            owners = occupancy.shared.get(pos, {int(occupancy.owner[pos]) : int(occupancy.count[pos])})
+            for id, c in owners.items():
+                for level in range(c):
+                    h ^= self.segment(id, pos, level)
+        for pos, val in fruits.items():
+            h ^= self.fruit(pos, val)
+        return h
+
+
+class TranspositionTable:
+    """
+    Bounded table {hash => (depth, value, flag, move)} for tree search.
+    Each hash maps to one slot. A stored entry is replaced by a new one for the same position,
+    by one from a newer search (see newSearch) or by one searched at least as deep.
+    """
+
+    EXACT, LOWER, UPPER = 0, 1, 2
+
+    def __init__(self, size = 2**18):
+        self.size = size
+        self.entries = [None] * size
+        self.age = 0
+        self.hits = 0
+        self.misses = 0
+
+    def newSearch(self):
+        """
+        Mark entries stored so far as stale, so that they are the first to be replaced.
+        """
+        self.age += 1
+
+    def clear(self):
+        self.entries = [None] * self.size
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, h):
+        """
+        Entry (hash, depth, value, flag, move, age) stored for `h`, None if there is none.
+        """
+        e = self.entries[h % self.size]
+        if e is not None and e[0] == h:
+            self.hits += 1
+            return e
+        self.misses += 1
+        return None
+
+    def store(self, h, depth, value, flag = EXACT, move = None):
+        i = h % self.size
+        e = self.entries[i]
+        if e is None or e[0] == h or e[5] != self.age or depth >= e[1]:
+            self.entries[i] = (h, depth, value, flag, move, self.age)
+
+    def probe(self, h, depth, alpha, beta):
+        """
+        Value stored for `h` if it was searched at least `depth` deep and is usable within [alpha, beta],
+        None otherwise.
+        """
+        e = self.lookup(h)
+        if e is None or e[1] < depth:
+            return None
+        _, _, value, flag, _, _ = e
+        if flag == self.EXACT or (flag == self.LOWER and value >= beta) or (flag == self.UPPER and value <= alpha):
+            return value
+        return None
+
+    def bestMove(self, h):
+        """
+        Move stored for `h` (to be tried first), None if unknown.
+        """
+        e = self.entries[h % self.size]
+        if e is not None and e[0] == h:
+            return e[4]
+        return None
+
+    def __len__(self):
+        return sum(e is not None for e in self.entries)